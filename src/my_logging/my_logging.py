@@ -1,37 +1,106 @@
+import atexit
+import copy
 import logging
+import logging.handlers
 import os
+import queue
 
-# Valid log levels
-valid_levels = {"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"}
+# Valid log levels mapped to their logging constants
+_LEVELS = {name: getattr(logging, name) for name in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")}
+
+# Maximum number of records waiting for the listener; further records are dropped instead of blocking the caller
+LOG_QUEUE_SIZE = 8192
+
+# Logger name -> environment variable holding its level
+_LOGGER_LEVEL_ENV = (
+    ("server", "LOG_LEVEL"),
+    ("fastmcp", "SERVER_LOG_LEVEL"),
+    ("mcp", "MCP_LOG_LEVEL"),
+    ("asyncio", "ASYNCIO_LOG_LEVEL"),
+    ("sap_controller", "SAP_CONTROLLER_LOG_LEVEL"),
+    ("sap_logon_pad", "SAP_LOGON_PAD_LOG_LEVEL"),
+)
 
 
 # Validate and convert to logging constants
 def get_log_level(level_str: str, default: str = "ERROR") -> int:
     """Convert string log level to logging constant."""
-    level_str = level_str.upper()
-    if level_str not in valid_levels:
-        level_str = default
-    return getattr(logging, level_str)
+    return _LEVELS.get(level_str.upper(), _LEVELS[default])
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler for a bounded queue that drops records when the queue is full instead of waiting."""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue never leaves the process, so the record does not have to be made picklable. Only the
+        # arguments are merged here, while their values are current; tracebacks are formatted by the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.dropped:
+                # Report the loss once the listener has caught up, ahead of the record that got through
+                self.queue.put_nowait(
+                    logging.makeLogRecord(
+                        {
+                            "name": __name__,
+                            "levelno": logging.WARNING,
+                            "levelname": "WARNING",
+                            "msg": "Dropped %d log records because the log queue was full",
+                            "args": (self.dropped,),
+                        }
+                    )
+                )
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    """QueueListener whose stop sentinel waits for room in a full queue instead of failing."""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
 
 
 # Configure logging from environment variables
 def configure_logging() -> None:
-    """Configure logging levels from environment variables."""
+    """
+    Configure logging levels from environment variables.
+
+    Records are handed to a queue and written to stderr by a background listener thread, so
+    tools only pay for an enqueue instead of a blocking write per log call. The queue holds at
+    most LOG_QUEUE_SIZE records; when the listener falls behind, records are dropped and counted.
+    """
+    root_logger = logging.getLogger()
+    if root_logger.handlers:
+        # Same as logging.basicConfig: leave an existing configuration alone
+        return
+
     # Configure root logger
-    root_level = get_log_level(os.getenv("LOG_LEVEL", "ERROR").upper())
-    logging.basicConfig(
-        level=root_level, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
+    root_level = get_log_level(os.environ.get("LOG_LEVEL", "ERROR"))
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
     )
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    root_logger.setLevel(root_level)
+    root_logger.addHandler(_DroppingQueueHandler(log_queue))
+
+    listener = _QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    # Stopping the listener drains the queue, so records logged right before exit are not lost
+    atexit.register(listener.stop)
 
 
 # Configure individual logger levels
-server_logger = logging.getLogger("server").setLevel(get_log_level(os.getenv("LOG_LEVEL", "ERROR").upper()))
-factmcp_logger = logging.getLogger("fastmcp").setLevel(get_log_level(os.getenv("SERVER_LOG_LEVEL", "ERROR").upper()))
-mcp_logger = logging.getLogger("mcp").setLevel(get_log_level(os.getenv("MCP_LOG_LEVEL", "ERROR").upper()))
-asyncio_logger = logging.getLogger("asyncio").setLevel(get_log_level(os.getenv("ASYNCIO_LOG_LEVEL", "ERROR").upper()))
-sap_controller_logger = logging.getLogger("sap_controller").setLevel(
-    get_log_level(os.getenv("SAP_CONTROLLER_LOG_LEVEL", "ERROR").upper())
-)
-sap_logon_pad = logging.getLogger("sap_logon_pad").setLevel(
-    get_log_level(os.getenv("SAP_LOGON_PAD_LOG_LEVEL", "ERROR").upper())
-)
+for _logger_name, _env_var in _LOGGER_LEVEL_ENV:
+    logging.getLogger(_logger_name).setLevel(get_log_level(os.environ.get(_env_var, "ERROR")))
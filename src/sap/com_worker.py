@@ -0,0 +1,29 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+import pythoncom
+
+# A single COM-initialized thread for long-running SAP GUI work, so it never blocks the event loop.
+# It is one thread on purpose: SAP GUI serializes scripting calls anyway, and handles cached by
+# sap.logon_pad stay valid because they are thread-local and always used from this same thread.
+_COM_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sap-com", initializer=pythoncom.CoInitialize)
+
+
+async def run_com(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a function that talks to SAP GUI on the COM worker thread and await its result.
+
+    The function must obtain its own session (e.g. via `sap_session()`); COM proxies created on
+    the event loop thread cannot be used from the worker.
+
+    Args:
+        func: Function to run.
+        *args: Positional arguments for `func`.
+        **kwargs: Keyword arguments for `func`.
+
+    Returns:
+        Whatever `func` returns
+    """
+    return await asyncio.get_running_loop().run_in_executor(_COM_EXECUTOR, partial(func, *args, **kwargs))
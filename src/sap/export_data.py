@@ -1,13 +1,215 @@
+from contextlib import suppress
 from logging import getLogger
-from typing import Optional
+from typing import Iterator, Optional, Sequence
 import win32com.client
+import csv
+import io
 import os
-from datetime import datetime
 
-from sap.logon_pad import sap_session
+from sap.gui import apply_to_element, column_titles, evict_element, find_element
+from sap.logon_pad import early_bound, sap_session
+from sap.paths import default_output_dir, ensure_dir, unique_file_timestamp
 
 
 logger = getLogger("sap_controller")
+CHUNK_ROWS = 10_000
+WRITE_BUFFER_SIZE = 1 << 20
+# Suffix of the file a direct grid read writes to until the whole grid is in it
+PARTIAL_SUFFIX = ".part"
+
+# ALV export dialog element IDs, fields relative to the configuration subscreen
+EXPORT_DIALOG_CONFIG_ID = "wnd[1]/usr/ssubSUB_CONFIGURATION:SAPLSALV_GUI_CUL_EXPORT_AS:0512"
+EXPORT_DIALOG_FILE_NAME_FIELD = "txtGS_EXPORT-FILE_NAME"
+EXPORT_DIALOG_FORMAT_FIELD = "cmbGS_EXPORT-FORMAT"
+EXPORT_DIALOG_FORMAT_KEY = "csv-LEAN-STANDARD"
+# Cancel button of the export popup, used to close it when the dialog export fails part-way
+EXPORT_DIALOG_CANCEL_ID = "wnd[1]/tbar[0]/btn[12]"
+
+
+def _build_export_path(output_path: Optional[str], identifier: Optional[str]) -> str:
+    """Resolve the export directory and build a timestamped CSV file path inside it."""
+    if not output_path:
+        # Create export directory in current working directory
+        _export_dir = default_output_dir("exports")
+    else:
+        # Ensure the directory exists
+        _export_dir = ensure_dir(os.path.dirname(output_path))
+
+    # Generate filename with timestamp and identifier if provided
+    _identifier_part = f"{identifier}_" if identifier else ""
+    return os.path.join(
+        _export_dir,
+        f"export_{_identifier_part}{unique_file_timestamp()}.csv",
+    )
+
+
+def iter_grid_chunks(
+    grid: win32com.client.CDispatch,
+    chunk_rows: int,
+    start_row: int = 0,
+    end_row: Optional[int] = None,
+    col_ids: Optional[Sequence[str]] = None,
+) -> Iterator[list[list[str]]]:
+    """
+    Read a GridView with one COM call per cell, loading rows page by page.
+
+    SAP GUI Scripting has no bulk cell read, so this is the cheapest way to get every value out of a grid.
+    The cell loop is the hottest COM path in the server, so pass the grid as returned by `find_element`,
+    which has already bound it to its generated class.
+
+    Args:
+        grid: GridView element to read.
+        chunk_rows: Maximum number of rows per yielded chunk.
+        start_row: First row to read (0-based).
+        end_row: Row to stop before. If None or past the last row, reads to the end of the grid.
+        col_ids: Ids of the columns to read, in output order. If None, reads all columns in display order.
+
+    Yields:
+        list[list[str]]: The column titles as a single-row chunk, then the grid rows in chunks of at most `chunk_rows` rows.
+    """
+    # Read the grid dimensions and column ids once; each property access is a COM round-trip
+    row_count = grid.RowCount
+    start_row = max(start_row, 0)
+    end_row = row_count if end_row is None else min(end_row, row_count)
+    page_size = max(grid.VisibleRowCount, 1)
+    if col_ids is None:
+        column_order = grid.ColumnOrder
+        col_ids = tuple(column_order.Item(col_idx) for col_idx in range(grid.ColumnCount))
+    yield [column_titles(grid, col_ids)]
+
+    # Bind the cell accessor once so the inner loop skips the late-bound name lookup per cell
+    get_cell_value = grid.GetCellValue
+    chunk = []
+    for row_idx in range(start_row, end_row):
+        # GridView only loads rows from the backend once they are scrolled into view
+        if (row_idx - start_row) % page_size == 0:
+            grid.FirstVisibleRow = row_idx
+        chunk.append([get_cell_value(row_idx, col_id) for col_id in col_ids])
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _write_grid_csv(
+    grid: win32com.client.CDispatch, export_path: str, chunk_rows: int = CHUNK_ROWS
+) -> Iterator[list[list[str]]]:
+    """
+    Write the grid to `export_path` chunk by chunk, yielding each chunk once it has been written.
+
+    Rows go to a PARTIAL_SUFFIX file next to `export_path` that only replaces it once the whole grid
+    has been read, so a failed read never leaves a partial file where the export dialog fallback would
+    find it.
+    """
+    _partial_path = export_path + PARTIAL_SUFFIX
+    try:
+        # A large binary buffer under the text layer keeps the row writes from turning into many small
+        # write syscalls, which matters most when exports land on a network share
+        with io.TextIOWrapper(
+            open(_partial_path, "wb", buffering=WRITE_BUFFER_SIZE), encoding="utf-8", newline="", write_through=False
+        ) as export_file:
+            writer = csv.writer(export_file)
+            for chunk in iter_grid_chunks(grid, chunk_rows):
+                writer.writerows(chunk)
+                yield chunk
+    except BaseException:
+        # Also reached through GeneratorExit when a stream consumer stops before the last chunk
+        with suppress(OSError):
+            os.remove(_partial_path)
+        raise
+    os.replace(_partial_path, export_path)
+
+
+def _write_grid_csv_file(grid: win32com.client.CDispatch, export_path: str) -> None:
+    """Write the whole grid to `export_path`, without handing the chunks to a caller."""
+    for _ in _write_grid_csv(grid, export_path):
+        pass
+
+
+def export_grid_stream(
+    grid_id: str,
+    session: Optional[win32com.client.CDispatch] = None,
+    output_path: Optional[str] = None,
+    identifier: Optional[str] = None,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Iterator[list[list[str]]]:
+    """
+    Stream SAP GUI grid rows into a CSV file, yielding each chunk as soon as it is written.
+
+    Unlike `export_grid_as_csv`, rows are read directly from the GridView so the caller can start
+    processing the first chunk before the rest of the grid has been read. The first chunk holds the
+    column titles.
+
+    Args:
+        grid_id: SAP GUI element ID of the grid to export.
+        session: SAP session object. If None, uses the current session.
+        output_path: Path where the exported CSV should be saved. If None, generates a default path.
+        identifier: Optional identifier or name for the export operation, such as transaction code or table name. Will be included in the filename if provided.
+        chunk_rows: Maximum number of rows per yielded chunk (default: 10,000).
+
+    Yields:
+        list[list[str]]: Rows written to the CSV file, one chunk at a time.
+
+    Raises:
+        ValueError: If no session is available or the grid cannot be found or is not a GridView.
+    """
+    _current_session = session if session else sap_session()
+    if not _current_session:
+        raise ValueError("No current session available. Cannot export data.")
+
+    _grid, error_msg = _resolve_grid(_current_session, grid_id)
+    if _grid is None:
+        raise ValueError(error_msg)
+
+    _export_path = _build_export_path(output_path, identifier)
+    logger.info("Streaming grid '%s' to: %s", grid_id, _export_path)
+    try:
+        yield from _write_grid_csv(_grid, _export_path, chunk_rows)
+    except Exception:
+        # The cached grid may be gone; resolve it again on the next export
+        evict_element(grid_id)
+        raise
+
+
+def _resolve_grid(
+    session: win32com.client.CDispatch, grid_id: str
+) -> tuple[Optional[win32com.client.CDispatch], str]:
+    """Resolve a GridView through the element cache, returning (grid, "") or (None, error message)."""
+    # apply_to_element checks a cached grid before using it, so a grid left behind by navigation is resolved again
+    _found, _subtype = apply_to_element(session, grid_id, lambda grid: grid.Subtype)
+    if not _found:
+        return None, f"Grid with ID '{grid_id}' not found."
+    if _subtype != "GridView":
+        return None, f"Element with ID '{grid_id}' is not a GridView. Found type: {_subtype}"
+    return find_element(session, grid_id), ""
+
+
+def _export_via_dialog(
+    session: win32com.client.CDispatch, grid: win32com.client.CDispatch, export_path: str
+) -> None:
+    """Drive the ALV 'Export > Spreadsheet' dialog to let SAP GUI write the CSV file."""
+    grid.PressToolbarContextButton("&MB_EXPORT")
+    grid.SelectContextMenuItem("&XXL")
+    # Bind the lookups once instead of resolving FindById again for every field and button. FindById results are
+    # typed as GuiComponent, which has no FindById, Text, Key or Press, so each one is re-wrapped before use
+    find_by_id = session.FindById
+    # Resolve the configuration subscreen once and address its fields relative to it
+    find_config_field = early_bound(find_by_id(EXPORT_DIALOG_CONFIG_ID)).FindById
+    early_bound(find_config_field(EXPORT_DIALOG_FILE_NAME_FIELD)).Text = export_path
+    early_bound(find_config_field(EXPORT_DIALOG_FORMAT_FIELD)).Key = EXPORT_DIALOG_FORMAT_KEY
+    early_bound(find_by_id("wnd[1]/tbar[0]/btn[20]")).Press()
+    early_bound(find_by_id("wnd[1]/tbar[0]/btn[0]")).Press()
+
+
+def _close_export_dialog(session: win32com.client.CDispatch) -> None:
+    """Cancel the export popup if a failed dialog export left it open, so it does not block the session."""
+    try:
+        _cancel = session.FindById(EXPORT_DIALOG_CANCEL_ID, False)
+        if _cancel is not None:
+            early_bound(_cancel).Press()
+    except Exception as e:
+        logger.warning("Failed to close the export dialog: %s", e)
 
 
 def export_grid_as_csv(
@@ -15,20 +217,26 @@ def export_grid_as_csv(
     session: Optional[win32com.client.CDispatch] = None,
     output_path: Optional[str] = None,
     identifier: Optional[str] = None,
+    bulk: bool = False,
 ) -> tuple[str, str]:
     """
     Export SAP GUI grid data to a CSV file.
 
+    Rows are streamed directly from the GridView; the ALV export dialog is only used as a fallback
+    when direct row access fails. With `bulk`, the dialog is used right away: SAP GUI then writes the
+    whole grid itself instead of one COM call per cell, which is much faster for large grids but needs
+    an ALV grid that offers the spreadsheet export.
+
     Args:
         grid_id: SAP GUI element ID of the grid to export.
         output_path: Path where the exported CSV should be saved. If None, generates a default path.
         session: SAP session object. If None, uses the current session.
         identifier: Optional identifier or name for the export operation, such as transaction code or table name. Will be included in the filename if provided.
+        bulk: Let the ALV export dialog write the file instead of reading the grid cell by cell.
 
     Returns:
         tuple[str, str]: String for 'file_path' on success or an empty string on failure and 'error' message if any otherwise an empty string.
     """
-    _export_dir = ""
     _export_path = ""
     try:
         # Get current session if not provided
@@ -42,56 +250,40 @@ def export_grid_as_csv(
             logger.error(error_msg)
             return _export_path, error_msg
 
-        # Generate output path if not provided
-        if not output_path:
-            # Create export directory in current working directory
-            _export_dir = os.path.join(os.getcwd(), "exports")
-            os.makedirs(_export_dir, exist_ok=True)
-        else:
-            # Ensure the directory exists
-            _export_dir = os.path.dirname(output_path)
-            if _export_dir and not os.path.exists(_export_dir):
-                os.makedirs(_export_dir, exist_ok=True)
-
-        # Generate filename with timestamp and identifier if provided
-        _identifier_part = f"{identifier}_" if identifier else ""
-        _export_path = os.path.join(
-            _export_dir,
-            f"export_{_identifier_part}{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-        )
-
-        # Find the grid control
-        _grid = _current_session.FindById(grid_id)
-        if not _grid:
-            error_msg = f"Grid with ID '{grid_id}' not found."
-            logger.error(error_msg)
-            return _export_path, error_msg
+        # Generate output path
+        _export_path = _build_export_path(output_path, identifier)
 
-        # Check that the grid is subtype of GridView
-        if _grid.Subtype != "GridView":
-            error_msg = f"Element with ID '{grid_id}' is not a GridView. Found type: {_grid.Subtype}"
+        # Find the grid control and check that it is a GridView
+        _grid, error_msg = _resolve_grid(_current_session, grid_id)
+        if _grid is None:
             logger.error(error_msg)
             return _export_path, error_msg
 
-        # Perform the export
+        # Perform the export; the direct grid read and the export dialog are each other's fallback
         try:
-            _grid.pressToolbarContextButton("&MB_EXPORT")
-            _grid.selectContextMenuItem("&XXL")
-            _current_session.FindById(
-                "wnd[1]/usr/ssubSUB_CONFIGURATION:SAPLSALV_GUI_CUL_EXPORT_AS:0512/txtGS_EXPORT-FILE_NAME"
-            ).text = _export_path
-            _current_session.FindById(
-                "wnd[1]/usr/ssubSUB_CONFIGURATION:SAPLSALV_GUI_CUL_EXPORT_AS:0512/cmbGS_EXPORT-FORMAT"
-            ).setFocus()
-            _current_session.FindById(
-                "wnd[1]/usr/ssubSUB_CONFIGURATION:SAPLSALV_GUI_CUL_EXPORT_AS:0512/cmbGS_EXPORT-FORMAT"
-            ).key = "csv-LEAN-STANDARD"
-            _current_session.FindById("wnd[1]/tbar[0]/btn[20]").press()
-            _current_session.FindById("wnd[1]/tbar[0]/btn[0]").press()
+            if bulk:
+                _export_via_dialog(_current_session, _grid, _export_path)
+            else:
+                _write_grid_csv_file(_grid, _export_path)
         except Exception as e:
-            error_msg = f"Failed to export grid data: {str(e)}"
-            logger.error(error_msg)
-            return _export_path, error_msg
+            logger.warning(
+                "Grid export failed, falling back to the %s: %s", "direct grid read" if bulk else "export dialog", e
+            )
+            if bulk:
+                # The grid cannot be read while the modal export popup is still open
+                _close_export_dialog(_current_session)
+            try:
+                if bulk:
+                    _write_grid_csv_file(_grid, _export_path)
+                else:
+                    _export_via_dialog(_current_session, _grid, _export_path)
+            except Exception as e:
+                if not bulk:
+                    _close_export_dialog(_current_session)
+                evict_element(grid_id)
+                error_msg = f"Failed to export grid data: {e}"
+                logger.error(error_msg)
+                return _export_path, error_msg
 
         # Verify the file was created
         if os.path.exists(_export_path):
@@ -104,6 +296,7 @@ def export_grid_as_csv(
             return _export_path, error_msg
 
     except Exception as e:
-        error_msg = f"Failed to export data: {str(e)}"
+        evict_element(grid_id)
+        error_msg = f"Failed to export data: {e}"
         logger.error(error_msg)
         return _export_path, error_msg
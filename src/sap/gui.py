@@ -1,37 +1,321 @@
+from itertools import count
 from logging import getLogger
-from typing import Optional
+from typing import Any, Callable, Iterable, Optional
+import pythoncom
 import win32com.client
-import json
+import orjson
 import os
-from datetime import datetime
+import tempfile
 
-from sap.logon_pad import sap_session
+from sap.logon_pad import early_bound, sap_session
+from sap.paths import default_output_dir, ensure_dir, unique_file_timestamp
 
 logger = getLogger("sap_controller")
 MAX_RETRIES = 10
 WAIT_TIME = 3.0
 POLLING_INTERVAL = 0.5
+ELEMENT_CACHE_SIZE = 128
 
+SUMMARY_PROPERTIES = ["Id", "Type", "Name"]
 
-def sap_object_tree_as_json(session: Optional[win32com.client.CDispatch]) -> dict:
-    """Convert SAP object tree string to JSON."""
+# Resolved elements keyed by element id, stored as (session, element) so a new session never sees them
+_ELEMENT_CACHE: dict[str, tuple[win32com.client.CDispatch, win32com.client.CDispatch]] = {}
+# Scrollbar objects of cached grids keyed by (id(grid), axis), stored as (grid, scrollbar); keeping the grid
+# in the entry keeps its id from being reused while the entry exists
+_SCROLLBAR_CACHE: dict[tuple[int, str], tuple[win32com.client.CDispatch, win32com.client.CDispatch]] = {}
+SCROLLBAR_PROPERTIES = {"v": "VerticalScrollbar", "h": "HorizontalScrollbar"}
+# Column titles of cached grids keyed by id(grid), stored as (grid, {column id: title}) like the scrollbars
+_TITLE_CACHE: dict[int, tuple[win32com.client.CDispatch, dict[str, str]]] = {}
+
+# Sequence numbers for the temporary files used by capture_screenshot_bytes
+_SCREENSHOT_COUNTER = count()
+# HardCopy format codes (0 = BMP and 1 = DIB are uncompressed and not offered)
+HARDCOPY_FORMATS = {"png": 3, "jpeg": 2}
+
+
+def find_element(
+    session: win32com.client.CDispatch, element_id: str, raise_error: bool = True
+) -> Optional[win32com.client.CDispatch]:
+    """
+    Resolve an element by ID, reusing the element resolved earlier for the same session.
+
+    Lookups go through a single FindById call rather than walking `Children` segment by segment:
+    every step of such a walk would be its own COM round-trip, while SAP GUI parses the ID in-process.
+
+    Elements are re-wrapped with their early-bound class before they are cached, so the repeated
+    calls on a cached element go through precomputed DISPIDs.
+
+    Cached elements belong to the screen they were found on, so callers must call
+    `invalidate_element_cache` after anything that can change the screen and `evict_element`
+    when a call on the element fails.
+
+    Args:
+        session: SAP session object.
+        element_id: ID of the element to find (e.g., "wnd[0]/usr/txtRSYST-BNAME").
+        raise_error: Raise if the element does not exist instead of returning None.
+
+    Returns:
+        The element, or None if it was not found and `raise_error` is False
+    """
+    _entry = _ELEMENT_CACHE.get(element_id)
+    if _entry is not None and _entry[0] is session:
+        return _entry[1]
+    _element = session.FindById(element_id, raise_error)
+    if _element is not None:
+        _element = early_bound(_element)
+        if len(_ELEMENT_CACHE) >= ELEMENT_CACHE_SIZE:
+            # Evict the oldest entry; dicts keep insertion order
+            del _ELEMENT_CACHE[next(iter(_ELEMENT_CACHE))]
+        _ELEMENT_CACHE[element_id] = (session, _element)
+    return _element
+
+
+def apply_to_element(
+    session: win32com.client.CDispatch,
+    element_id: str,
+    action: Callable[[win32com.client.CDispatch], Any],
+    changes_screen: bool = False,
+) -> tuple[bool, Any]:
+    """
+    Resolve an element through the element cache and apply `action` to it.
+
+    A cached element can go stale when the screen changes behind the cache's back (e.g. the user
+    navigates in SAP GUI). A cached element is therefore checked with a cheap `Id` read first and
+    resolved again if that fails. `action` itself runs exactly once: a COM error from it is a real
+    failure (e.g. a read-only field) and may come after the action already took effect, so it is
+    never retried.
+
+    Args:
+        session: SAP session object.
+        element_id: ID of the element (e.g., "wnd[0]/usr/txtRSYST-BNAME").
+        action: Function called with the element; its result is returned.
+        changes_screen: The action may change the screen, so the element cache is cleared before it runs.
+
+    Returns:
+        tuple[bool, Any]: (False, None) if the element does not exist, otherwise (True, result of `action`)
+    """
+    _entry = _ELEMENT_CACHE.get(element_id)
+    if _entry is not None and _entry[0] is session:
+        try:
+            _entry[1].Id
+        except pythoncom.com_error:
+            logger.debug("Cached element '%s' is stale, resolving it again", element_id)
+            evict_element(element_id)
+    _element = find_element(session, element_id, raise_error=False)
+    if _element is None:
+        return False, None
+    if changes_screen:
+        invalidate_element_cache()
     try:
-        _json_objects = []
-        if not session:
-            _current_session = sap_session()
-        else:
-            _current_session = session
+        return True, action(_element)
+    except pythoncom.com_error:
+        evict_element(element_id)
+        raise
+
+
+def grid_scrollbar(grid: win32com.client.CDispatch, axis: str) -> win32com.client.CDispatch:
+    """
+    Return the vertical ("v") or horizontal ("h") scrollbar of a grid, reusing the one fetched earlier.
+
+    Fetching the scrollbar is a COM round-trip of its own, so reading its position would otherwise cost two.
+    The entry lives as long as the grid object does; once the grid is resolved again, so is its scrollbar.
+
+    Args:
+        grid: Grid element, usually from `find_element`.
+        axis: "v" for the vertical or "h" for the horizontal scrollbar.
+
+    Returns:
+        The scrollbar object
+    """
+    _key = (id(grid), axis)
+    _entry = _SCROLLBAR_CACHE.get(_key)
+    if _entry is not None and _entry[0] is grid:
+        return _entry[1]
+    _scrollbar = getattr(grid, SCROLLBAR_PROPERTIES[axis])
+    if len(_SCROLLBAR_CACHE) >= ELEMENT_CACHE_SIZE:
+        del _SCROLLBAR_CACHE[next(iter(_SCROLLBAR_CACHE))]
+    _SCROLLBAR_CACHE[_key] = (grid, _scrollbar)
+    return _scrollbar
+
+
+def column_titles(grid: win32com.client.CDispatch, col_ids: Iterable[str]) -> list[str]:
+    """
+    Return the first title variant of each column, reusing the titles read earlier from the same grid.
+
+    GetColumnTitles only describes a single column, so there is no one-shot call for all titles;
+    each column not seen before costs the GetColumnTitles call and one Item. Titles are remembered
+    per grid object and dropped with the element cache, so a grid that is resolved again reads them afresh.
+
+    Args:
+        grid: GridView element the columns belong to, usually from `find_element`.
+        col_ids: Column ids as listed by the grid's ColumnOrder.
+
+    Returns:
+        Column titles in the order of `col_ids`
+    """
+    _entry = _TITLE_CACHE.get(id(grid))
+    if _entry is None or _entry[0] is not grid:
+        if len(_TITLE_CACHE) >= ELEMENT_CACHE_SIZE:
+            # Evict the oldest grid; dicts keep insertion order
+            del _TITLE_CACHE[next(iter(_TITLE_CACHE))]
+        _entry = _TITLE_CACHE[id(grid)] = (grid, {})
+    _titles = _entry[1]
+    for col_id in col_ids:
+        if col_id not in _titles:
+            _titles[col_id] = grid.GetColumnTitles(col_id).Item(0)
+    return [_titles[col_id] for col_id in col_ids]
+
+
+def evict_element(element_id: str) -> None:
+    """Drop one cached element so the next lookup resolves it again, e.g. after a call on it failed."""
+    _ELEMENT_CACHE.pop(element_id, None)
+
+
+def invalidate_element_cache() -> None:
+    """Drop all cached elements, e.g. after a command or button press that may have changed the screen."""
+    _ELEMENT_CACHE.clear()
+    _SCROLLBAR_CACHE.clear()
+    _TITLE_CACHE.clear()
+
+
+def _window_tree(session: win32com.client.CDispatch, window_id: str) -> Optional[str]:
+    """Fetch the raw object tree of one window, or None if SAP GUI fails to describe it (e.g. it just closed)."""
+    try:
+        return session.GetObjectTree(window_id)
+    except pythoncom.com_error as e:
+        logger.warning("Skipping window '%s' in the object tree: %s", window_id, e)
+        return None
+
+
+def _window_trees(session: win32com.client.CDispatch) -> list[str]:
+    """Return the object tree JSON of all windows, skipping windows that fail."""
+    # Trees are always fetched fresh: field values, tabstrips and subscreens change without the screen number
+    # changing, so no cache key short of the tree itself tells a stale tree apart. Windows are fetched one after
+    # another on this thread: SAP GUI serializes scripting calls, so extra threads would only add overhead.
+    return [_tree for _tree in (_window_tree(session, window.Id) for window in session.Children) if _tree is not None]
+
+
+def _parse_tree(tree: str) -> Optional[dict]:
+    """Parse one object tree, or return None so a single malformed tree does not fail the whole result."""
+    try:
+        return orjson.loads(tree)
+    except orjson.JSONDecodeError as e:
+        logger.warning("Skipping undecodable object tree: %s", e)
+        return None
+
+
+def _prune_tree(node: dict, depth: int) -> dict:
+    """Return a copy of `node` keeping at most `depth` levels of children."""
+    _children = node.get("children")
+    if not _children:
+        return node
+    if depth <= 0:
+        return {key: value for key, value in node.items() if key != "children"}
+    return {**node, "children": [_prune_tree(child, depth - 1) for child in _children]}
+
+
+def _flatten_summary(node: dict, summary: list[dict]) -> None:
+    """Append the id, type and name of `node` and all of its descendants to `summary`."""
+    _properties = node.get("properties", node)
+    summary.append({"id": _properties.get("Id"), "type": _properties.get("Type"), "name": _properties.get("Name")})
+    for child in node.get("children") or []:
+        _flatten_summary(child, summary)
+
+
+def sap_object_tree_as_json(
+    session: Optional[win32com.client.CDispatch],
+    root_id: Optional[str] = None,
+    depth: Optional[int] = None,
+) -> dict:
+    """
+    Convert SAP object tree string to JSON.
+
+    Args:
+        session: SAP session object. If None, uses the current session.
+        root_id: ID of the element whose subtree should be returned (e.g., "wnd[0]/usr"). If None, all windows are returned.
+        depth: Maximum number of child levels to include below each returned root. If None, the full tree is returned.
+
+    Returns:
+        Dictionary with a "Windows" list holding one tree per window, or only the subtree of `root_id` when given
+    """
+    if not session:
+        _current_session = sap_session()
+    else:
+        _current_session = session
+    if not _current_session:
+        logger.error("No current session available.")
+        return {"Windows": []}
+    _trees = [_current_session.GetObjectTree(root_id)] if root_id else _window_trees(_current_session)
+    _json_objects = [_tree for _tree in map(_parse_tree, _trees) if _tree is not None]
+    if depth is not None:
+        _json_objects = [_prune_tree(_tree, depth) for _tree in _json_objects]
+    return {"Windows": _json_objects}
+
+
+def sap_object_tree_text(session: Optional[win32com.client.CDispatch], root_id: Optional[str] = None) -> str:
+    """
+    Return the SAP object tree as JSON text without parsing it.
+
+    The trees returned by GetObjectTree are already JSON, so they are spliced into the
+    {"Windows": [...]} document as they are. Use `sap_object_tree_as_json` to prune or inspect the tree.
+
+    Args:
+        session: SAP session object. If None, uses the current session.
+        root_id: ID of the element whose subtree should be returned (e.g., "wnd[0]/usr"). If None, all windows are returned.
+
+    Returns:
+        JSON text of a {"Windows": [...]} document, with no windows if no session is available
+    """
+    _current_session = session if session else sap_session()
+    if not _current_session:
+        logger.error("No current session available.")
+        return '{"Windows":[]}'
+    _trees = [_current_session.GetObjectTree(root_id)] if root_id else _window_trees(_current_session)
+    return '{"Windows":[' + ",".join(_trees) + "]}"
+
+
+def sap_object_summary(session: Optional[win32com.client.CDispatch] = None) -> list[dict]:
+    """
+    List the id, type and name of every element in the current session.
+
+    Only the summary properties are requested from SAP GUI, so this is much cheaper than
+    `sap_object_tree_as_json` and can be used to pick the subtree to fetch in full.
+
+    Args:
+        session: SAP session object. If None, uses the current session.
+
+    Returns:
+        List of {"id", "type", "name"} dictionaries, one per element
+    """
+    try:
+        _summary: list[dict] = []
+        _current_session = session if session else sap_session()
         if not _current_session:
             logger.error("No current session available.")
-            return {"Windows": []}
-        _windows = _current_session.Children
-        for window in _windows:
-            _win = json.loads(_current_session.GetObjectTree(window.Id))
-            _json_objects.append(_win)
-        return {"Windows": _json_objects}
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to decode SAP object tree: {str(e)}")
-        return {"Windows": []}
+            return _summary
+        for window in _current_session.Children:
+            _flatten_summary(orjson.loads(_current_session.GetObjectTree(window.Id, SUMMARY_PROPERTIES)), _summary)
+        return _summary
+    except orjson.JSONDecodeError as e:
+        logger.error("Failed to decode SAP object tree: %s", e)
+        return []
+
+
+def _screenshot_window(
+    session: win32com.client.CDispatch, window_id: Optional[str]
+) -> tuple[Optional[win32com.client.CDispatch], str]:
+    """Resolve the window to capture, returning (window, "") or (None, error message)."""
+    if window_id:
+        window = session.FindById(window_id, False)
+        if window is None:
+            return None, f"Window with ID '{window_id}' not found."
+        # FindById returns a GuiComponent, which has no HardCopy; re-wrap it as the window it is
+        return early_bound(window), ""
+    # Use active window
+    window = session.ActiveWindow
+    if window is None:
+        return None, "No active window found in the current session."
+    return window, ""
 
 
 def capture_screenshot(
@@ -63,39 +347,22 @@ def capture_screenshot(
             return False, error_msg
 
         # Determine which window to capture
-        if window_id:
-            try:
-                window = _current_session.FindById(window_id)
-                if not window:
-                    error_msg = f"Window with ID '{window_id}' not found."
-                    logger.error(error_msg)
-                    return False, error_msg
-            except Exception as e:
-                error_msg = f"Failed to find window '{window_id}': {str(e)}"
-                logger.error(error_msg)
-                return False, error_msg
-        else:
-            # Use active window
-            window = _current_session.ActiveWindow
-            if not window:
-                error_msg = "No active window found in the current session."
-                logger.error(error_msg)
-                return False, error_msg
+        window, error_msg = _screenshot_window(_current_session, window_id)
+        if window is None:
+            logger.error(error_msg)
+            return False, error_msg
 
         # Generate output path if not provided
         if not output_path:
             # Create screenshots directory in current working directory
-            screenshots_dir = os.path.join(os.getcwd(), "screenshots")
-            os.makedirs(screenshots_dir, exist_ok=True)
+            screenshots_dir = default_output_dir("screenshots")
 
             # Generate filename with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = unique_file_timestamp()
             output_path = os.path.join(screenshots_dir, f"sap_screenshot_{timestamp}.png")
         else:
             # Ensure the directory exists
-            output_dir = os.path.dirname(output_path)
-            if output_dir and not os.path.exists(output_dir):
-                os.makedirs(output_dir, exist_ok=True)
+            ensure_dir(os.path.dirname(output_path))
 
         # Capture the screenshot using SAP GUI's HardCopy method
         # HardCopy saves the window as an image file
@@ -114,6 +381,61 @@ def capture_screenshot(
             return False, error_msg
 
     except Exception as e:
-        error_msg = f"Failed to capture screenshot: {str(e)}"
+        error_msg = f"Failed to capture screenshot: {e}"
         logger.error(error_msg)
         return False, error_msg
+
+
+def capture_screenshot_bytes(
+    window_id: Optional[str] = None,
+    session: Optional[win32com.client.CDispatch] = None,
+    image_format: str = "png",
+) -> tuple[Optional[bytes], str]:
+    """
+    Capture a screenshot of the SAP GUI window and return the image data instead of a file path.
+
+    HardCopy can only write to a file, so the image goes through a per-process temporary file
+    that is removed as soon as it has been read. SAP GUI does the encoding itself and offers no
+    compression level; JPEG is the cheaper option when a smaller, lossy image is good enough.
+
+    Args:
+        window_id: ID of the window to capture (e.g., "wnd[0]"). If None, captures the active window.
+        session: SAP session object. If None, uses the current session.
+        image_format: "png" (default, lossless) or "jpeg" (smaller and faster to encode and transfer).
+
+    Returns:
+        Tuple of (image: bytes | None, message: str) where image is None on failure and message contains the error
+    """
+    if image_format not in HARDCOPY_FORMATS:
+        error_msg = f"Unsupported image format '{image_format}'. Use one of: {', '.join(HARDCOPY_FORMATS)}."
+        logger.error(error_msg)
+        return None, error_msg
+    _temp_path = os.path.join(
+        tempfile.gettempdir(), f"sap_{os.getpid()}_{next(_SCREENSHOT_COUNTER)}.{image_format}"
+    )
+    try:
+        _current_session = session if session else sap_session()
+        if not _current_session:
+            error_msg = "No current session available. Cannot capture screenshot."
+            logger.error(error_msg)
+            return None, error_msg
+
+        window, error_msg = _screenshot_window(_current_session, window_id)
+        if window is None:
+            logger.error(error_msg)
+            return None, error_msg
+
+        window.HardCopy(_temp_path, HARDCOPY_FORMATS[image_format])
+        # Unbuffered: read() sizes the result from fstat and fetches the file in one call, without a buffer copy
+        with open(_temp_path, "rb", buffering=0) as image_file:
+            return image_file.read(), "Screenshot captured successfully."
+
+    except Exception as e:
+        error_msg = f"Failed to capture screenshot: {e}"
+        logger.error(error_msg)
+        return None, error_msg
+    finally:
+        try:
+            os.remove(_temp_path)
+        except OSError:
+            pass
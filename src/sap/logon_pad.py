@@ -1,48 +1,313 @@
+import functools
 import os
-import subprocess
+import shutil
+import threading
 import time
-from typing import Optional
+from typing import Callable, Optional
 import win32com.client
+from win32com.client import gencache
 import ctypes
+from ctypes import wintypes
+from dotenv import load_dotenv
+from locale import windows_locale
 from logging import getLogger
 
 logger = getLogger("sap_logon_pad")
 MAX_RETRIES = 10
 WAIT_TIME = 30.0
 POLLING_INTERVAL = 0.5
+FIRST_POLLING_INTERVAL = 0.01
+SESSION_CACHE_TTL = 2.0
+# Process images that can host the SAP GUI Scripting engine (SAP Logon, SAP Logon Pad, standalone SAP GUI)
+SAP_GUI_PROCESS_NAMES = frozenset(("saplogon.exe", "saplgpad.exe", "sapgui.exe"))
+
+# Standard SAP login screen field IDs, relative to the login screen's user area
+LOGIN_USER_AREA_ID = "wnd[0]/usr"
+LOGIN_CLIENT_FIELD = "txtRSYST-MANDT"
+LOGIN_USER_FIELD = "txtRSYST-BNAME"
+LOGIN_PASSWORD_FIELD = "pwdRSYST-BCODE"
+LOGIN_LANGUAGE_FIELD = "txtRSYST-LANGU"
+LOGIN_CLIENT_ID = f"{LOGIN_USER_AREA_ID}/{LOGIN_CLIENT_FIELD}"
+LOGIN_PASSWORD_ID = f"{LOGIN_USER_AREA_ID}/{LOGIN_PASSWORD_FIELD}"
+
+# Environment variables used for logins, snapshotted at import and refreshed by reload_sap_env()
+SAP_ENV_VARS = ("SAP_SYSTEM", "SAP_CLIENT", "SAP_USER", "SAP_PASSWORD", "SAP_LANGUAGE", "SAP_USE_SSO")
+# Login parameters that fall back to environment variables, the first one is also required for SSO
+LOGIN_PARAM_ENV_VARS = (
+    ("system", "SAP_SYSTEM"),
+    ("client", "SAP_CLIENT"),
+    ("user", "SAP_USER"),
+    ("password", "SAP_PASSWORD"),
+)
+SAP_ENV: dict[str, str] = {}
+# Session properties reported by session_info; the session id is added as "SessionId"
+SESSION_INFO_FIELDS = ("User", "Client", "Language", "SystemName", "SystemNumber")
+
+
+def reload_sap_env(read_dotenv: bool = False) -> dict[str, str]:
+    """
+    Replace the environment snapshot with the current values of SAP_ENV_VARS that are set and return it.
+
+    Args:
+        read_dotenv: Re-read the .env file first, letting its values override the process environment.
+            Without it only changes made to os.environ inside the server process are picked up.
+
+    Returns:
+        The refreshed snapshot
+    """
+    if read_dotenv:
+        load_dotenv(override=True)
+    SAP_ENV.clear()
+    SAP_ENV.update((name, os.environ[name]) for name in SAP_ENV_VARS if name in os.environ)
+    return SAP_ENV
+
+
+reload_sap_env()
+
+
+def resolve_login_params(
+    system: Optional[str] = None,
+    client: Optional[str] = None,
+    user: Optional[str] = None,
+    password: Optional[str] = None,
+    use_sso: bool = False,
+) -> tuple[dict[str, Optional[str]], list[str]]:
+    """
+    Fill missing login parameters from the environment snapshot and check the required ones.
+
+    Args:
+        system: SAP system ID, falls back to SAP_SYSTEM.
+        client: SAP client number, falls back to SAP_CLIENT.
+        user: SAP username, falls back to SAP_USER.
+        password: SAP password, falls back to SAP_PASSWORD.
+        use_sso: If True, only the system is required.
+
+    Returns:
+        tuple[dict, list[str]]: The parameters by name and the missing required ones as "name (ENV_VAR)"
+    """
+    params = {
+        name: value or SAP_ENV.get(env_var)
+        for (name, env_var), value in zip(LOGIN_PARAM_ENV_VARS, (system, client, user, password))
+    }
+    required = LOGIN_PARAM_ENV_VARS[:1] if use_sso else LOGIN_PARAM_ENV_VARS
+    return params, [f"{name} ({env_var})" for name, env_var in required if not params[name]]
+
+
+def wait_until(predicate: Callable[[], bool], timeout: float, interval: float = POLLING_INTERVAL) -> bool:
+    """
+    Poll `predicate` until it returns True or `timeout` seconds have passed.
+
+    Polling starts every FIRST_POLLING_INTERVAL seconds and backs off to `interval`, so fast responses
+    are noticed almost immediately without polling slow ones at a high rate.
+
+    Returns:
+        True if the predicate was satisfied, False on timeout
+    """
+    deadline = time.monotonic() + timeout
+    delay = min(FIRST_POLLING_INTERVAL, interval)
+    while not predicate():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, interval)
+    return True
+
+
+# SAP GUI Scripting API type library (SAPFEWSELib, sapfewse.ocx): CLSID, LCID, major, minor version
+SAP_SCRIPTING_TYPELIB = ("{5EA428A0-F2B8-45E7-99FA-0E994E82B5BC}", 0, 1, 0)
+
+
+def _ensure_early_binding() -> bool:
+    """
+    Generate (or load the cached) early-bound wrappers for the SAP GUI Scripting type library.
+
+    Returns:
+        True if early-bound wrappers are available, False if late binding must be used
+    """
+    try:
+        gencache.EnsureModule(*SAP_SCRIPTING_TYPELIB)
+        return True
+    except Exception as e:
+        logger.warning("SAP GUI Scripting type library unavailable, using late-bound COM dispatch: %s", e)
+        return False
+
+
+_EARLY_BINDING = _ensure_early_binding()
+
+
+def early_bound(handle: win32com.client.CDispatch) -> win32com.client.CDispatch:
+    """
+    Re-wrap a COM handle with the generated class of its runtime type when early binding is available.
+
+    Collection items and FindById results are typed by their declared interface, so re-wrapping from
+    the object's own type info gives the session, engine or element every member of its concrete class,
+    called through precomputed DISPIDs instead of a GetIDsOfNames lookup per call.
+    """
+    if _EARLY_BINDING:
+        return win32com.client.Dispatch(handle._oleobj_)
+    return handle
 
 
+# Cached COM handles as (timestamp, handle). COM proxies belong to the apartment of the thread
+# that created them, so every thread keeps its own cache.
+_com_cache = threading.local()
+
+
+def _cache_get(name: str) -> Optional[win32com.client.CDispatch]:
+    """Return the cached COM handle `name` if it is younger than SESSION_CACHE_TTL, None otherwise."""
+    entry = getattr(_com_cache, name, None)
+    if entry is not None and time.monotonic() - entry[0] < SESSION_CACHE_TTL:
+        return entry[1]
+    return None
+
+
+def _cache_put(name: str, handle: win32com.client.CDispatch) -> win32com.client.CDispatch:
+    """Store a COM handle in the cache of the current thread and return it."""
+    setattr(_com_cache, name, (time.monotonic(), handle))
+    return handle
+
+
+def _cache_revalidate(
+    name: str, probe: Callable[[win32com.client.CDispatch], object]
+) -> Optional[win32com.client.CDispatch]:
+    """
+    Return the cached COM handle `name` while it is fresh, or once it is stale, if it still answers `probe`.
+
+    A single probe call is much cheaper than resolving the handle again from the Running Object Table.
+    A handle that fails the probe is dropped.
+    """
+    entry = getattr(_com_cache, name, None)
+    if entry is None:
+        return None
+    if time.monotonic() - entry[0] < SESSION_CACHE_TTL:
+        return entry[1]
+    try:
+        probe(entry[1])
+    except Exception:
+        delattr(_com_cache, name)
+        return None
+    return _cache_put(name, entry[1])
+
+
+def invalidate_session_cache() -> None:
+    """Drop all cached COM handles of the current thread."""
+    _com_cache.__dict__.clear()
+
+
+def session_info(session: win32com.client.CDispatch) -> dict:
+    """
+    Read the session id and the SESSION_INFO_FIELDS of a session.
+
+    Info is resolved once and every field is read off that local, instead of going through session.Info
+    again for each field. Nothing is kept between calls: User, Client and Language change when someone
+    logs off and on again in the same session.
+
+    Args:
+        session: SAP session object.
+
+    Returns:
+        Dictionary with "SessionId" and one entry per SESSION_INFO_FIELDS
+    """
+    _info = session.Info
+    return {"SessionId": session.Id, **{field: getattr(_info, field) for field in SESSION_INFO_FIELDS}}
+
+
+def _scripting_engine() -> Optional[win32com.client.CDispatch]:
+    """
+    Get the SAP GUI Scripting engine, reusing the cached handle while it still responds.
+
+    Returns:
+        SAP GUI application object if SAP GUI is running, None otherwise
+    """
+    sap_application = _cache_revalidate("application", lambda application: application.Connections.Count)
+    if sap_application is not None:
+        return sap_application
+
+    sap_gui = win32com.client.GetObject("SAPGUI")
+    if not sap_gui:
+        logger.error("SAP GUI is not running. Please start SAP GUI first.")
+        return None
+
+    sap_application = sap_gui.GetScriptingEngine
+    if not sap_application:
+        logger.error("Failed to get SAP Scripting Engine.")
+        return None
+
+    # Re-wrap with the generated GuiApplication class; objects returned from it are early-bound too
+    return _cache_put("application", early_bound(sap_application))
+
+
+@functools.cache
 def get_system_language() -> str | None:
     """
     Get the system's default language code.
 
+    The UI language does not change while the process runs, so the result is computed once.
+
     Returns:
         Language code as a string (e.g., "en_US") or None if it cannot be determined
     """
-    # Get the system default locale
+    # Prefer the user UI language and only ask for the system one when it has no locale mapping
     kernel32 = ctypes.windll.kernel32
-    language_id = kernel32.GetUserDefaultUILanguage()
-    system_language_id = kernel32.GetSystemDefaultUILanguage()
-
-    # Convert LANGID to language string
-    def langid_to_locale(langid):
-        from locale import windows_locale
-
-        return windows_locale.get(langid, None)
-
-    _language = langid_to_locale(language_id) if langid_to_locale(language_id) else langid_to_locale(system_language_id)
+    _language = windows_locale.get(kernel32.GetUserDefaultUILanguage()) or windows_locale.get(
+        kernel32.GetSystemDefaultUILanguage()
+    )
     if _language == "en_US":
         return "EN"
     return _language
 
 
+# Toolhelp snapshot flag and the PROCESSENTRY32W layout used to list running processes
+TH32CS_SNAPPROCESS = 0x00000002
+INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+
+
+class _ProcessEntry32W(ctypes.Structure):
+    _fields_ = [
+        ("dwSize", wintypes.DWORD),
+        ("cntUsage", wintypes.DWORD),
+        ("th32ProcessID", wintypes.DWORD),
+        ("th32DefaultHeapID", ctypes.c_size_t),
+        ("th32ModuleID", wintypes.DWORD),
+        ("cntThreads", wintypes.DWORD),
+        ("th32ParentProcessID", wintypes.DWORD),
+        ("pcPriClassBase", wintypes.LONG),
+        ("dwFlags", wintypes.DWORD),
+        ("szExeFile", wintypes.WCHAR * wintypes.MAX_PATH),
+    ]
+
+
+def _sap_gui_process_running() -> Optional[bool]:
+    """Return whether a process from SAP_GUI_PROCESS_NAMES exists, or None when the process list is unavailable."""
+    kernel32 = ctypes.windll.kernel32
+    kernel32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+    _snapshot = kernel32.CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+    if not _snapshot or _snapshot == INVALID_HANDLE_VALUE:
+        return None
+    try:
+        _entry = _ProcessEntry32W(dwSize=ctypes.sizeof(_ProcessEntry32W))
+        _has_entry = kernel32.Process32FirstW(wintypes.HANDLE(_snapshot), ctypes.byref(_entry))
+        while _has_entry:
+            if _entry.szExeFile.lower() in SAP_GUI_PROCESS_NAMES:
+                return True
+            _has_entry = kernel32.Process32NextW(wintypes.HANDLE(_snapshot), ctypes.byref(_entry))
+        return False
+    finally:
+        kernel32.CloseHandle(wintypes.HANDLE(_snapshot))
+
+
 def is_sap_logon_running() -> bool:
     """
-    Check if SAP Logon (saplogon.exe) is currently running.
+    Check if SAP Logon (or another SAP GUI host from SAP_GUI_PROCESS_NAMES) is currently running.
 
     Returns:
         True if SAP Logon is running, False otherwise
     """
+    if _cache_get("application") is not None:
+        return True
+    # A process table scan is far cheaper than the COM probe and rules out the common "not started" case
+    if _sap_gui_process_running() is False:
+        return False
     try:
         # Try to get SAP GUI object - if it exists, SAP Logon is running
         sap_gui = win32com.client.GetObject("SAPGUI")
@@ -67,23 +332,16 @@ def find_sap_logon_path() -> str | None:
 
     # Check environment variable for custom SAP GUI path
     sap_gui_path = os.getenv("SAP_LOGON_PATH")
-    if sap_gui_path and os.path.exists(sap_gui_path):
+    if sap_gui_path and os.path.isfile(sap_gui_path):
         return sap_gui_path
 
     # Check common installation paths
     for path in common_paths:
-        if os.path.exists(path):
+        if os.path.isfile(path):
             return path
 
     # Try to find in PATH environment variable
-    try:
-        result = subprocess.run(["where", "saplogon.exe"], capture_output=True, text=True, timeout=5, shell=True)
-        if result.returncode == 0 and result.stdout.strip():
-            return result.stdout.strip().split("\n")[0]
-    except Exception:
-        pass
-
-    return None
+    return shutil.which("saplogon.exe")
 
 
 def launch_sap_logon(wait_time: float = WAIT_TIME, max_retries: int = MAX_RETRIES) -> tuple[bool, str]:
@@ -111,7 +369,7 @@ def launch_sap_logon(wait_time: float = WAIT_TIME, max_retries: int = MAX_RETRIE
             return False, error_msg
 
         # Launch SAP Logon
-        logger.info(f"Launching SAP Logon from: {sap_logon_path}")
+        logger.info("Launching SAP Logon from: %s", sap_logon_path)
         # subprocess.Popen([sap_logon_path])
         os.startfile(sap_logon_path)
 
@@ -132,7 +390,7 @@ def launch_sap_logon(wait_time: float = WAIT_TIME, max_retries: int = MAX_RETRIE
         return False, error_msg
 
     except Exception as e:
-        error_msg = f"Failed to launch SAP Logon: {str(e)}"
+        error_msg = f"Failed to launch SAP Logon: {e}"
         logger.error(error_msg)
         return False, error_msg
 
@@ -163,14 +421,8 @@ def create_sap_session(
     """
     try:
         # Get SAP GUI Scripting object
-        sap_gui = win32com.client.GetObject("SAPGUI")
-        if not sap_gui:
-            logger.error("SAP GUI is not running. Please start SAP GUI first.")
-            return None
-
-        sap_application = sap_gui.GetScriptingEngine
+        sap_application = _scripting_engine()
         if not sap_application:
-            logger.error("Failed to get SAP Scripting Engine.")
             return None
 
         # Build connection string
@@ -179,77 +431,90 @@ def create_sap_session(
         connection_string = system
 
         # Open connection
-        logger.info(f"Attempting to connect to SAP system: {system}")
+        logger.info("Attempting to connect to SAP system: %s", system)
         connection = sap_application.OpenConnection(connection_string, True)
 
         if not connection:
-            logger.error(f"Failed to open connection to system: {system}")
+            logger.error("Failed to open connection to system: %s", system)
             return None
 
         # Wait for connection to be established
-        start_time = time.time()
-        while not connection.Sessions and (time.time() - start_time) < max_wait_time:
-            time.sleep(POLLING_INTERVAL)
-
-        if not connection.Sessions:
+        if not wait_until(lambda: bool(connection.Sessions), max_wait_time):
             logger.error("Connection established but no session created.")
             return None
 
-        session = connection.Sessions[0]
+        # Collection items come back as GuiComponent, which lacks FindById, Busy and the other session members
+        session = early_bound(connection.Sessions[0])
 
         # Handle login based on authentication method
         try:
-            # Wait for login window to appear
-            time.sleep(max_wait_time)
+            # Wait for login window to appear, resolving the password field once it does
+            _password_field = None
+
+            def _login_screen_ready() -> bool:
+                nonlocal _password_field
+                _password_field = session.FindById(LOGIN_PASSWORD_ID, False)
+                return _password_field is not None
+
+            wait_until(_login_screen_ready, max_wait_time)
+            # FindById results are typed as GuiComponent as well, so every handle whose own members are used is
+            # re-wrapped first; a GuiComponent has no SendVKey or Text
+            _main_window = early_bound(session.FindById("wnd[0]"))
 
             if use_sso:
                 # SSO Authentication - use Windows credentials
-                logger.info(f"Attempting SSO login to {system}")
+                logger.info("Attempting SSO login to %s", system)
 
                 # For SSO, we typically only need to set client and press Enter
                 # SAP GUI will handle Windows authentication automatically
                 if client:
-                    session.FindById("wnd[0]/usr/txtRSYST-MANDT").Text = client
+                    early_bound(session.FindById(LOGIN_CLIENT_ID)).Text = client
 
                 # Press Enter to trigger SSO authentication
-                session.FindById("wnd[0]").SendVKey(0)  # VKey 0 = Enter
+                _main_window.SendVKey(0)  # VKey 0 = Enter
 
             else:
                 # Standard credential-based authentication
-                logger.info(f"Attempting credential login to {system} as {user}")
-
-                # Find and fill login fields
-                # Standard SAP login screen field IDs
-                session.FindById("wnd[0]/usr/txtRSYST-MANDT").Text = client
-                session.FindById("wnd[0]/usr/txtRSYST-BNAME").Text = user
-                session.FindById("wnd[0]/usr/pwdRSYST-BCODE").Text = password
-                session.FindById("wnd[0]/usr/txtRSYST-LANGU").Text = language
+                logger.info("Attempting credential login to %s as %s", system, user)
+
+                # Find and fill login fields relative to the user area so the path prefix is only resolved once,
+                # binding its FindById once instead of resolving it again for every field
+                find_login_field = early_bound(session.FindById(LOGIN_USER_AREA_ID)).FindById
+                early_bound(find_login_field(LOGIN_CLIENT_FIELD)).Text = client
+                early_bound(find_login_field(LOGIN_USER_FIELD)).Text = user
+                early_bound(_password_field or find_login_field(LOGIN_PASSWORD_FIELD)).Text = password
+                if language:
+                    # Left empty, the field keeps the default logon language
+                    early_bound(find_login_field(LOGIN_LANGUAGE_FIELD)).Text = language
 
                 # Press Enter to login
-                session.FindById("wnd[0]").SendVKey(0)  # VKey 0 = Enter
+                _main_window.SendVKey(0)  # VKey 0 = Enter
 
-            # Wait for login to complete
-            time.sleep(max_wait_time)
+            # Wait for login to complete: the session is idle and the password field is gone
+            _logged_in = wait_until(
+                lambda: not session.Busy and session.FindById(LOGIN_PASSWORD_ID, False) is None, max_wait_time
+            )
 
-            # Check if login was successful by verifying we're not still on login screen
-            try:
+            # Check if login was successful by verifying we're not still on login screen;
+            # only needed after a timeout, otherwise the wait has just seen the field disappear
+            if not _logged_in and session.FindById(LOGIN_PASSWORD_ID, False) is not None:
                 # If we can still find the password field, login failed
-                session.FindById("wnd[0]/usr/pwdRSYST-BCODE")
                 auth_method = "SSO" if use_sso else "credential"
-                logger.error(f"Login failed - still on login screen. Check {auth_method} configuration.")
+                logger.error("Login failed - still on login screen. Check %s configuration.", auth_method)
                 return None
-            except Exception:
-                # Password field not found = we've moved past login screen = success
-                auth_method = "SSO" if use_sso else f"credentials for {user}"
-                logger.info(f"Successfully logged in to {system} using {auth_method}")
-                return session
+
+            # Password field not found = we've moved past login screen = success
+            auth_method = "SSO" if use_sso else f"credentials for {user}"
+            logger.info("Successfully logged in to %s using %s", system, auth_method)
+            return _cache_put("session", session)
 
         except Exception as login_error:
-            logger.error(f"Error during login process: {str(login_error)}")
+            logger.error("Error during login process: %s", login_error)
             return None
 
     except Exception as e:
-        logger.error(f"Failed to create SAP session: {str(e)}")
+        invalidate_session_cache()
+        logger.error("Failed to create SAP session: %s", e)
         return None
 
 
@@ -264,22 +529,23 @@ def sap_session(auto_login: bool = False) -> Optional[win32com.client.CDispatch]
         SAP session object if available or created, None otherwise
     """
     try:
-        sap_gui = win32com.client.GetObject("SAPGUI")
-        if not sap_gui:
-            logger.error("SAP GUI is not running.")
-            return None
+        # Reuse the cached session while it is fresh, afterwards while it still answers a cheap property read;
+        # callers drop it with invalidate_session_cache() when a COM call on it fails
+        session = _cache_revalidate("session", lambda session: session.Busy)
+        if session is not None:
+            return session
 
-        sap_application = sap_gui.GetScriptingEngine
+        sap_application = _scripting_engine()
         if not sap_application:
-            logger.error("Failed to get SAP Scripting Engine.")
             return None
 
-        # Check for existing connections and sessions
-        if sap_application.Connections and sap_application.Connections.Count > 0:
-            connection = sap_application.Connections[0]
-            if connection.Sessions and connection.Sessions.Count > 0:
+        # Check for existing connections and sessions; fetch each collection once, every access is a COM call
+        connections = sap_application.Connections
+        if connections.Count > 0:
+            sessions = connections[0].Sessions
+            if sessions.Count > 0:
                 # Existing session found
-                return connection.Sessions[0]
+                return _cache_put("session", early_bound(sessions[0]))
 
         # No existing session found
         if not auto_login:
@@ -289,44 +555,17 @@ def sap_session(auto_login: bool = False) -> Optional[win32com.client.CDispatch]
         # Attempt auto-login using environment credentials
         logger.info("No existing session found. Attempting auto-login...")
 
-        # Get credentials from environment variables
-        sap_system = os.getenv("SAP_SYSTEM")
-        sap_client = os.getenv("SAP_CLIENT")
-        sap_user = os.getenv("SAP_USER")
-        sap_password = os.getenv("SAP_PASSWORD")
-        sap_language = os.getenv("SAP_LANGUAGE", "EN")
-
-        # Validate credentials are available
-        if not all([sap_system, sap_client, sap_user, sap_password]):
-            missing = []
-            if not sap_system:
-                missing.append("SAP_SYSTEM")
-            if not sap_client:
-                missing.append("SAP_CLIENT")
-            if not sap_user:
-                missing.append("SAP_USER")
-            if not sap_password:
-                missing.append("SAP_PASSWORD")
-
-            logger.error(f"Auto-login failed: Missing required environment variables: {', '.join(missing)}")
-            return None
-
-        # Type narrowing: Ensure sap_system is not None before calling create_sap_session
-        # This should never happen due to validation above, but satisfies the type checker
-        if sap_system is None:
-            error_msg = "Login failed: System parameter is required"
-            logger.error(error_msg)
+        # Get credentials from the environment snapshot
+        params, missing = resolve_login_params()
+        # The None check is implied by `missing` and only narrows the type of the system
+        if missing or params["system"] is None:
+            logger.error("Auto-login failed: Missing required environment variables: %s", ", ".join(missing))
             return None
 
         # Create new session
-        return create_sap_session(
-            system=sap_system,
-            client=sap_client,
-            user=sap_user,
-            password=sap_password,
-            language=sap_language,
-        )
+        return create_sap_session(**params, language=SAP_ENV.get("SAP_LANGUAGE", "EN"))
 
     except Exception as e:
-        logger.error(f"Error in sap_session: {str(e)}")
+        invalidate_session_cache()
+        logger.error("Error in sap_session: %s", e)
         return None
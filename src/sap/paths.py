@@ -0,0 +1,68 @@
+import os
+import time
+
+# Last formatted filename timestamp as [epoch second, formatted string, names handed out in that second]
+_last_timestamp: list = [-1, "", 0]
+
+
+def ensure_dir(path: str) -> str:
+    """
+    Create a directory (and its parents) if needed.
+
+    Checked on every call rather than cached, so a directory deleted while the server runs is created again.
+
+    Args:
+        path: Directory to create. An empty string stands for the current directory and is left as-is.
+
+    Returns:
+        The same path, so the call can be used inline
+    """
+    if path and not os.path.isdir(path):
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def default_output_dir(name: str) -> str:
+    """
+    Get a directory named `name` in the current working directory, creating it if it does not exist.
+
+    Args:
+        name: Name of the output directory (e.g., "exports", "screenshots")
+
+    Returns:
+        Absolute path of the output directory
+    """
+    return ensure_dir(os.path.join(os.getcwd(), name))
+
+
+def file_timestamp() -> str:
+    """
+    Get the current local time formatted for file names (YYYYMMDD_HHMMSS).
+
+    The formatted string is reused for calls within the same second.
+
+    Returns:
+        Timestamp string
+    """
+    now = int(time.time())
+    if now != _last_timestamp[0]:
+        _last_timestamp[0] = now
+        _last_timestamp[1] = time.strftime("%Y%m%d_%H%M%S", time.localtime(now))
+        _last_timestamp[2] = 0
+    return _last_timestamp[1]
+
+
+def unique_file_timestamp() -> str:
+    """
+    Get a file name timestamp that is unique within this process.
+
+    The first call in a second returns the plain timestamp (YYYYMMDD_HHMMSS); further calls in the
+    same second append a counter (YYYYMMDD_HHMMSS_1, _2, ...) so quick successive files do not overwrite each other.
+
+    Returns:
+        Timestamp string
+    """
+    _stamp = file_timestamp()
+    _sequence = _last_timestamp[2]
+    _last_timestamp[2] += 1
+    return f"{_stamp}_{_sequence}" if _sequence else _stamp
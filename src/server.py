@@ -1,22 +1,186 @@
 from fastmcp import FastMCP
-from typing import Optional
-import json
+from fastmcp.utilities.types import Image
+from functools import wraps
+from itertools import chain
+from typing import Annotated, Any, Callable, Literal, Optional
+import base64
+import inspect
+import orjson
 import os
+import pythoncom
+import re
 import win32com.client
 from logging import getLogger
+from pydantic import BaseModel, Field, model_validator
+
+from sap.com_worker import run_com
+from sap.export_data import CHUNK_ROWS, export_grid_as_csv, iter_grid_chunks
+from sap.logon_pad import (
+    launch_sap_logon,
+    sap_session,
+    create_sap_session,
+    get_system_language,
+    invalidate_session_cache,
+    reload_sap_env,
+    resolve_login_params,
+    session_info,
+    SAP_ENV,
+    wait_until,
+)
+from sap.paths import ensure_dir
+from sap.gui import (
+    apply_to_element,
+    capture_screenshot,
+    capture_screenshot_bytes,
+    column_titles,
+    evict_element,
+    find_element,
+    grid_scrollbar,
+    invalidate_element_cache,
+    sap_object_summary,
+    sap_object_tree_as_json,
+    sap_object_tree_text,
+)
+
+
+def _serialize_tool_result(result) -> str:
+    """Serialize non-string tool results (dicts, lists) to compact JSON with orjson."""
+    if result is SUCCESS_RESULT:
+        return SUCCESS_JSON
+    return orjson.dumps(result, default=str).decode()
 
-from sap.export_data import export_grid_as_csv
-from sap.logon_pad import launch_sap_logon, sap_session, create_sap_session, get_system_language
-from sap.gui import sap_object_tree_as_json, capture_screenshot
 
 # Initialize FastMCP server
-mcp = FastMCP("SAP GUI MCP Server")
+mcp = FastMCP("SAP GUI MCP Server", tool_serializer=_serialize_tool_result)
 
 logger = getLogger("server")
 
+TRUTHY_VALUES = frozenset(("true", "1", "yes"))
+# Tool arguments that must not be empty; FastMCP rejects empty strings before the tool runs
+NonEmptyStr = Annotated[str, Field(min_length=1)]
+# One entry of GuiGridView.SelectedRows, e.g. "3" or "5-9"
+SELECTED_ROWS_PATTERN = re.compile(r"(\d+)(?:-(\d+))?")
+# Seconds to wait for SAP GUI to finish processing a grid action that may load another screen
+GRID_ACTION_TIMEOUT = 10.0
+# Error message templates shared by several tools
+NO_SESSION = "No current session available."
+ELEMENT_NOT_FOUND = "No element found with ID: %s"
+GRID_NOT_FOUND = "No grid found with ID: %s"
+# Shared result of tools that have nothing to report but success; the tool result serializer never mutates it
+# and answers it with JSON text encoded once at import
+SUCCESS_RESULT = {"success": True}
+SUCCESS_JSON = orjson.dumps(SUCCESS_RESULT).decode()
+
+
+def _dumps(obj, indent: bool = False) -> str:
+    """Serialize a tool response to a compact JSON string, indented with two spaces if `indent` is True."""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+
+
+def _error_text(error: BaseException) -> str:
+    """Return the readable part of an exception; for COM errors that is the description SAP GUI reported."""
+    if isinstance(error, pythoncom.com_error):
+        # args are (hresult, message, excepinfo, arg index); excepinfo[2] holds the source's description
+        _excepinfo = error.args[2] if len(error.args) > 2 else None
+        if _excepinfo and _excepinfo[2]:
+            return _excepinfo[2]
+    return str(error)
+
+
+def _selected_row_indices(selected_rows: str) -> list[int]:
+    """Expand GuiGridView.SelectedRows ("1,2,3" or "1-5") into row indices; overlapping entries are listed once."""
+    return list(
+        dict.fromkeys(
+            chain.from_iterable(
+                range(int(start), int(end) + 1) if end else (int(start),)
+                for start, end in SELECTED_ROWS_PATTERN.findall(selected_rows)
+            )
+        )
+    )
+
+
+def _err(template: str, *args) -> str:
+    """Format an error message, log it and return it so the tool can hand it back to the client."""
+    if args:
+        error_msg = template % tuple(_error_text(arg) if isinstance(arg, BaseException) else arg for arg in args)
+    else:
+        error_msg = template
+    logger.error(error_msg)
+    return error_msg
+
+
+def _ok(template: str, *args) -> str:
+    """Format a success message once, log it and return it so the tool can hand it back to the client."""
+    message = template % args if args else template
+    logger.info(message)
+    return message
+
+
+def _on_element(
+    session: win32com.client.CDispatch,
+    element_id: str,
+    action: Callable[[win32com.client.CDispatch], Any],
+    changes_screen: bool = False,
+) -> tuple[Any, Optional[str]]:
+    """Apply `action` to an element, returning (result, None) or (None, logged error message) if it does not exist."""
+    _found, _result = apply_to_element(session, element_id, action, changes_screen)
+    if not _found:
+        return None, _err(ELEMENT_NOT_FOUND, element_id)
+    return _result, None
+
+
+def _forget(element_id: str) -> None:
+    """Drop the cached element and session after a failed COM call, either may no longer exist."""
+    evict_element(element_id)
+    invalidate_session_cache()
+
+
+def require_session(action: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """
+    Pass the current SAP session to a tool as its first argument and run the tool on the COM worker thread.
+
+    The decorated tool becomes a coroutine function, so a slow SAP call never blocks the event loop.
+    When no session is available the tool is not called. Tools that report errors as text
+    return "No current session available. Cannot <action>."; without `action` the tool
+    returns {"error": "No current session available."} instead.
+
+    The `session` parameter is hidden from the wrapper's signature so it never shows up in the tool schema.
+
+    Args:
+        action: Short description of what the tool does, used in the error message.
+
+    Returns:
+        Decorator to apply below `@mcp.tool()`
+    """
+
+    # The message never changes, so build it once instead of on every call without a session
+    _no_session_msg = NO_SESSION if action is None else f"{NO_SESSION} Cannot {action}."
+
+    def decorator(func: Callable) -> Callable:
+        _signature = inspect.signature(func)
+
+        def call_with_session(*args, **kwargs):
+            session = sap_session()
+            if session is None:
+                if action is None:
+                    return {"error": _no_session_msg}
+                logger.error(_no_session_msg)
+                return _no_session_msg
+            return func(session, *args, **kwargs)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await run_com(call_with_session, *args, **kwargs)
+
+        wrapper.__signature__ = _signature.replace(parameters=list(_signature.parameters.values())[1:])
+        wrapper.__annotations__ = {name: hint for name, hint in func.__annotations__.items() if name != "session"}
+        return wrapper
+
+    return decorator
+
 
 @mcp.tool()
-def open_sap_logon_pad(wait_time: float = 3.0) -> str:
+async def open_sap_logon_pad(wait_time: float = 3.0) -> str:
     """
     Launch SAP Logon pad if it's not already running.
     This is useful for automating the complete SAP GUI workflow from scratch.
@@ -27,7 +191,7 @@ def open_sap_logon_pad(wait_time: float = 3.0) -> str:
     Returns:
         Success or error message
     """
-    success, message = launch_sap_logon(wait_time)
+    success, message = await run_com(launch_sap_logon, wait_time)
     if success:
         logger.info(message)
     else:
@@ -36,36 +200,34 @@ def open_sap_logon_pad(wait_time: float = 3.0) -> str:
 
 
 @mcp.tool()
-def get_session_info() -> str:
-    """Get information about the current SAP session."""
-    _current_session = sap_session()
-    if not _current_session:
-        return "No current session available."
+@require_session("retrieve session information")
+def get_session_info(session: win32com.client.CDispatch, pretty: bool = False) -> str:
+    """
+    Get information about the current SAP session.
+
+    Args:
+        pretty: Indent the JSON output for readability (default: False, compact output).
+
+    Returns:
+        JSON string of the session information or error message
+    """
     try:
-        info = {
-            "SessionId": _current_session.Id,
-            "User": _current_session.Info.User,
-            "Client": _current_session.Info.Client,
-            "Language": _current_session.Info.Language,
-            "SystemName": _current_session.Info.SystemName,
-            "SystemNumber": _current_session.Info.SystemNumber,
-        }
+        info = session_info(session)
         logger.info("Retrieved session information.")
-        return json.dumps(info, indent=2)
+        return _dumps(info, indent=pretty)
     except Exception as e:
-        error_msg = f"Failed to retrieve session information: {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        return _err("Failed to retrieve session information: %s", e)
 
 
 @mcp.tool()
-def login_to_sap(
+async def login_to_sap(
     system: Optional[str] = None,
     client: Optional[str] = None,
     user: Optional[str] = None,
     password: Optional[str] = None,
     language: Optional[str] = None,
     use_sso: bool = False,
+    return_info: bool = True,
 ) -> str:
     """
     Create a new SAP session by logging in with credentials or SSO.
@@ -79,401 +241,391 @@ def login_to_sap(
         password: SAP password. If None, uses SAP_PASSWORD env var. Not required if use_sso=True.
         language: SAP language code (default: System Language). If None, uses SAP_LANGUAGE env var. Not required if use_sso=True.
         use_sso: If True, use Windows SSO authentication instead of credentials (default: False).
+        return_info: If True, read the new session's details and return them as JSON (default: True).
+                     Set to False to skip those reads when only the login itself matters.
 
     Returns:
         Success message with session info or error message
     """
-    # Use environment variables if parameters not provided
-    sap_system = system if system is not None else os.getenv("SAP_SYSTEM", None)
-    sap_client = client if client is not None else os.getenv("SAP_CLIENT", None)
-    sap_user = user if user is not None else os.getenv("SAP_USER", None)
-    sap_password = password if password is not None else os.getenv("SAP_PASSWORD", None)
-    sap_language = language if language is not None else os.getenv("SAP_LANGUAGE", get_system_language())
-
     # Check if SSO should be used from environment variable
     # use_sso parameter takes precedence over environment variable
     if not use_sso:
-        sso_env = os.getenv("SAP_USE_SSO", "false").lower()
-        use_sso = sso_env in ("true", "1", "yes")
-
-    # Validate required parameters based on authentication method
+        use_sso = SAP_ENV.get("SAP_USE_SSO", "false").lower() in TRUTHY_VALUES
+
+    # Use environment variables if parameters not provided and validate them: SSO only needs the system
+    params, missing = resolve_login_params(system, client, user, password, use_sso=use_sso)
+    sap_system, sap_client, sap_user, sap_password = params.values()
+    # The None check is implied by `missing` and only narrows the type of sap_system
+    if missing or sap_system is None:
+        return _err("Login failed: Missing required parameters: %s", ", ".join(missing))
+    # Only look up the system language when neither the argument nor SAP_LANGUAGE provides one
+    sap_language = language or SAP_ENV.get("SAP_LANGUAGE") or get_system_language()
     if use_sso:
-        # For SSO, only system is required
-        if not sap_system:
-            error_msg = "Login failed: Missing required parameter: system (SAP_SYSTEM)"
-            logger.error(error_msg)
-            return error_msg
-        logger.info(f"Using SSO authentication for system {sap_system}")
-    else:
-        # For credential login, all fields are required
-        if not all([sap_system, sap_client, sap_user, sap_password]):
-            missing = []
-            if not sap_system:
-                missing.append("system (SAP_SYSTEM)")
-            if not sap_client:
-                missing.append("client (SAP_CLIENT)")
-            if not sap_user:
-                missing.append("user (SAP_USER)")
-            if not sap_password:
-                missing.append("password (SAP_PASSWORD)")
-
-            error_msg = f"Login failed: Missing required parameters: {', '.join(missing)}"
-            logger.error(error_msg)
-            return error_msg
-
-    # Type narrowing: Ensure sap_system is not None before calling create_sap_session
-    # This should never happen due to validation above, but satisfies the type checker
-    if sap_system is None:
-        error_msg = "Login failed: System parameter is required"
-        logger.error(error_msg)
-        return error_msg
+        logger.info("Using SSO authentication for system %s", sap_system)
 
     # At this point, sap_system is guaranteed to be str (not None)
     session: Optional[win32com.client.CDispatch] = None
     if use_sso:
-        logger.info(f"Attempting to login to {sap_system} using SSO")
-        session = create_sap_session(system=sap_system, use_sso=use_sso)
+        logger.info("Attempting to login to %s using SSO", sap_system)
+        session = await run_com(create_sap_session, system=sap_system, use_sso=use_sso)
     else:
-        logger.info(f"Attempting to login to {sap_system} as {sap_user}")
-        session = create_sap_session(
-            system=sap_system, client=sap_client, user=sap_user, password=sap_password, language=sap_language
+        logger.info("Attempting to login to %s as %s", sap_system, sap_user)
+        session = await run_com(
+            create_sap_session,
+            system=sap_system,
+            client=sap_client,
+            user=sap_user,
+            password=sap_password,
+            language=sap_language,
         )
 
+    if session and not return_info:
+        logger.info("Successfully created session for user %s", sap_user)
+        return f"Session created successfully for user {sap_user}"
     if session:
         try:
-            info = {
-                "Success": True,
-                "SessionId": session.Id,
-                "User": session.Info.User,
-                "Client": session.Info.Client,
-                "Language": session.Info.Language,
-                "SystemName": session.Info.SystemName,
-                "SystemNumber": session.Info.SystemNumber,
-            }
-            logger.info(f"Successfully created session for user {sap_user}")
-            return json.dumps(info, indent=2)
+            info = {"Success": True, **await run_com(session_info, session)}
+            logger.info("Successfully created session for user %s", sap_user)
+            return _dumps(info)
         except Exception as e:
-            logger.warning(f"Session created but failed to retrieve info: {str(e)}")
+            logger.warning("Session created but failed to retrieve info: %s", e)
             return f"Session created successfully for user {sap_user}"
     else:
-        error_msg = f"Failed to create SAP session for system {sap_system}. Check credentials and SAP GUI status."
-        logger.error(error_msg)
-        return error_msg
+        return _err("Failed to create SAP session for system %s. Check credentials and SAP GUI status.", sap_system)
 
 
 @mcp.tool()
-def start_transaction(transaction_code: str) -> str:
+def reload_env() -> str:
+    """
+    Re-read the .env file and the SAP_* environment variables used by login_to_sap.
+
+    The variables are read once when the server starts; call this after editing the .env file.
+    Values from the .env file take precedence over the server's process environment.
+
+    Returns:
+        Message listing which variables are set
+    """
+    message = f"Reloaded environment variables. Set: {', '.join(reload_sap_env(read_dotenv=True)) or 'none'}"
+    logger.info(message)
+    return message
+
+
+@mcp.tool()
+@require_session("start transaction")
+def start_transaction(session: win32com.client.CDispatch, transaction_code: NonEmptyStr) -> str:
     """Start a new SAP transaction by its transaction code."""
-    if not transaction_code:
-        error_msg = "No transaction code specified."
-        logger.error(error_msg)
-        return error_msg
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot start transaction."
-        logger.error(error_msg)
-        return error_msg
     try:
-        _current_session.StartTransaction(transaction_code)
-        logger.info(f"Started transaction: {transaction_code}")
-        return f"Started transaction: {transaction_code}"
+        invalidate_element_cache()
+        session.StartTransaction(transaction_code)
+        return _ok("Started transaction: %s", transaction_code)
     except Exception as e:
-        error_msg = f"Failed to start transaction '{transaction_code}': {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        return _err("Failed to start transaction '%s': %s", transaction_code, e)
 
 
 @mcp.tool()
-def end_transaction() -> str:
+@require_session("end transaction")
+def end_transaction(session: win32com.client.CDispatch) -> str:
     """End the current SAP transaction."""
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot end transaction."
-        logger.error(error_msg)
-        return error_msg
     try:
-        _current_session.EndTransaction()
-        logger.info("Ended current transaction.")
-        return "Ended current transaction."
+        invalidate_element_cache()
+        session.EndTransaction()
+        return _ok("Ended current transaction.")
     except Exception as e:
-        error_msg = f"Failed to end transaction: {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        return _err("Failed to end transaction: %s", e)
 
 
 @mcp.tool()
-def get_sap_gui_tree() -> str:
-    """Get a textual representation of the current SAP GUI tree."""
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot retrieve GUI tree."
-        logger.error(error_msg)
-        return error_msg
+@require_session("retrieve GUI tree")
+def get_sap_gui_tree(
+    session: win32com.client.CDispatch,
+    root_id: Optional[str] = None,
+    depth: Optional[int] = None,
+    pretty: bool = False,
+    output_path: Optional[str] = None,
+) -> str:
+    """
+    Get a textual representation of the current SAP GUI tree.
+
+    Args:
+        root_id: Optional ID of the element whose subtree should be returned (e.g., "wnd[0]/usr").
+                 If not provided, the trees of all windows are returned.
+        depth: Optional maximum number of child levels to include below the returned root(s).
+        pretty: Indent the JSON output for readability (default: False, compact output).
+        output_path: Optional path of a JSON file to write the tree to instead of returning it,
+                     for trees too large to pass through the MCP response.
+
+    Returns:
+        JSON string of the GUI tree, success message with the file path when output_path is given, or error message
+    """
     try:
-        # _gui_tree = json.dumps(json.loads(_current_session.GetObjectTree(_current_session.Children[0].Id)), indent=2)
-        _gui_tree = json.dumps(sap_object_tree_as_json(session=_current_session), indent=2)
+        if depth is None and not pretty:
+            # Nothing to prune or indent: hand out SAP GUI's own JSON without a parse/serialize round-trip
+            _gui_tree = sap_object_tree_text(session=session, root_id=root_id)
+        else:
+            _gui_tree = _dumps(sap_object_tree_as_json(session=session, root_id=root_id, depth=depth), indent=pretty)
+        if output_path:
+            ensure_dir(os.path.dirname(output_path))
+            with open(output_path, "w", encoding="utf-8") as tree_file:
+                tree_file.write(_gui_tree)
+            return _ok("SAP GUI tree saved to: %s", output_path)
         logger.info("Retrieved SAP GUI tree.")
         return _gui_tree
     except Exception as e:
-        error_msg = f"Failed to retrieve SAP GUI tree: {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        return _err("Failed to retrieve SAP GUI tree: %s", e)
 
 
 @mcp.tool()
-def find_by_id(element_id: str, raise_error: Optional[bool] = False) -> str:
+@require_session("retrieve GUI summary")
+def get_sap_gui_summary(session: win32com.client.CDispatch) -> list[dict] | str:
+    """Get the id, type and name of every element in the current SAP GUI tree."""
+    try:
+        _summary = sap_object_summary(session=session)
+        logger.info("Retrieved SAP GUI summary with %s elements.", len(_summary))
+        return _summary
+    except Exception as e:
+        return _err("Failed to retrieve SAP GUI summary: %s", e)
+
+
+@mcp.tool()
+@require_session("find element")
+def find_by_id(session: win32com.client.CDispatch, element_id: NonEmptyStr, raise_error: Optional[bool] = False) -> str:
     """Find a GUI element by its ID."""
-    if not element_id:
-        error_msg = "No element ID specified."
-        logger.error(error_msg)
-        return error_msg
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot find element."
-        logger.error(error_msg)
-        return error_msg
     try:
-        _current_element = _current_session.FindById(element_id, raise_error)
+        _current_element = find_element(session, element_id, bool(raise_error))
         if _current_element:
-            logger.info(f"Found element by ID: {element_id}")
+            logger.info("Found element by ID: %s", element_id)
             return f"Found element {_current_element.Id} by ID: {element_id}"
         else:
-            error_msg = f"No element found with ID: {element_id}"
-            logger.error(error_msg)
-            return error_msg
+            return _err(ELEMENT_NOT_FOUND, element_id)
     except Exception as e:
-        error_msg = f"Failed to find element with ID '{element_id}': {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        _forget(element_id)
+        return _err("Failed to find element with ID '%s': %s", element_id, e)
 
 
 @mcp.tool()
-def send_command(command: str) -> str:
+@require_session()
+def prepare_screen(session: win32com.client.CDispatch, element_ids: list[NonEmptyStr]) -> dict:
+    """
+    Resolve the elements a workflow is about to use on the current screen ahead of time.
+
+    The resolved elements are kept in the element cache, so the following tool calls on them skip the lookup.
+    The cache is cleared whenever the screen may change, so call this again after navigating.
+
+    Args:
+        element_ids: IDs of the elements to resolve (e.g., ["wnd[0]/usr/ctxtVBAK-AUART", "wnd[0]/tbar[1]/btn[8]"])
+
+    Returns:
+        Dictionary with the "found" and "missing" element IDs
+    """
+    found, missing = [], []
+    for element_id in element_ids:
+        try:
+            _element = find_element(session, element_id, raise_error=False)
+        except Exception as e:
+            logger.warning("Failed to resolve element ID '%s': %s", element_id, e)
+            _element = None
+        (found if _element is not None else missing).append(element_id)
+    logger.info("Prepared %s of %s elements.", len(found), len(element_ids))
+    return {"found": found, "missing": missing}
+
+
+@mcp.tool()
+@require_session("send command")
+def send_command(session: win32com.client.CDispatch, command: NonEmptyStr) -> str:
     """Send a command to the current SAP session."""
-    if not command:
-        error_msg = "No command specified."
-        logger.error(error_msg)
-        return error_msg
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot send command."
-        logger.error(error_msg)
-        return error_msg
     try:
-        _current_session.SendCommand(command)
-        logger.info(f"Sent command: {command}")
-        return f"Sent command: {command}"
+        invalidate_element_cache()
+        session.SendCommand(command)
+        return _ok("Sent command: %s", command)
     except Exception as e:
-        error_msg = f"Failed to send command '{command}': {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        return _err("Failed to send command '%s': %s", command, e)
 
 
 @mcp.tool()
-def send_command_async(command: str) -> str:
+@require_session("send command")
+def send_command_async(session: win32com.client.CDispatch, command: NonEmptyStr) -> str:
     """Send a command asynchronously to the current SAP session."""
-    if not command:
-        error_msg = "No command specified."
-        logger.error(error_msg)
-        return error_msg
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot send command."
-        logger.error(error_msg)
-        return error_msg
     try:
-        _current_session.SendCommandAsync(command)
-        logger.info(f"Sent command asynchronously: {command}")
-        return f"Sent command asynchronously: {command}"
+        invalidate_element_cache()
+        session.SendCommandAsync(command)
+        return _ok("Sent command asynchronously: %s", command)
     except Exception as e:
-        error_msg = f"Failed to send command '{command}' asynchronously: {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        return _err("Failed to send command '%s' asynchronously: %s", command, e)
 
 
 @mcp.tool()
-def check_gui_busy() -> str:
+@require_session("check if GUI is busy")
+def check_gui_busy(session: win32com.client.CDispatch) -> str:
     """Check if the SAP GUI is busy."""
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot check if GUI is busy."
-        logger.error(error_msg)
-        return error_msg
     try:
-        is_busy = _current_session.Busy
-        logger.info(f"SAP GUI busy status: {is_busy}")
-        return f"SAP GUI busy status: {is_busy}"
+        is_busy = session.Busy
+        return _ok("SAP GUI busy status: %s", is_busy)
     except Exception as e:
-        error_msg = f"Failed to check if SAP GUI is busy: {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        return _err("Failed to check if SAP GUI is busy: %s", e)
 
 
 @mcp.tool()
-def find_by_name(element_name: str, element_type: str) -> str:
+@require_session("find element")
+def find_by_name(session: win32com.client.CDispatch, element_name: NonEmptyStr, element_type: str) -> str:
     """Find a GUI element by its name and type."""
-    if not element_name:
-        error_msg = "No element name specified."
-        logger.error(error_msg)
-        return error_msg
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot find element."
-        logger.error(error_msg)
-        return error_msg
     try:
-        _current_element = _current_session.FindByName(element_name, element_type)
+        _current_element = session.FindByName(element_name, element_type)
         if _current_element:
-            logger.info(f"Found element by name: {element_name}")
+            logger.info("Found element by name: %s", element_name)
             return f"Found element {_current_element.Id} by name: {element_name}"
         else:
-            error_msg = f"No element found with name: {element_name}"
-            logger.error(error_msg)
-            return error_msg
+            return _err("No element found with name: %s", element_name)
     except Exception as e:
-        error_msg = f"Failed to find element with name '{element_name}': {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        return _err("Failed to find element with name '%s': %s", element_name, e)
 
 
 @mcp.tool()
-def find_all_by_name(element_name: str, element_type: str) -> list[str] | str:
+@require_session("find elements")
+def find_all_by_name(
+    session: win32com.client.CDispatch,
+    element_name: NonEmptyStr,
+    element_type: str,
+) -> list[str] | str:
     """Find all GUI elements by their name and type."""
-    if not element_name:
-        error_msg = "No element name specified."
-        logger.error(error_msg)
-        return error_msg
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot find elements."
-        logger.error(error_msg)
-        return error_msg
     try:
-        _elements = _current_session.FindAllByName(element_name, element_type)
-        if _elements:
-            element_ids = [elem.Id for elem in _elements]
-            logger.info(f"Found {len(_elements)} elements by name: {element_name}")
+        _elements = session.FindAllByName(element_name, element_type)
+        # Read Count once and index the collection directly; truthiness and len() would each ask for Count again
+        _count = _elements.Count if _elements is not None else 0
+        if _count:
+            element_at = _elements.ElementAt
+            element_ids = [element_at(elem_idx).Id for elem_idx in range(_count)]
+            logger.info("Found %s elements by name: %s", _count, element_name)
             return element_ids
         else:
-            error_msg = f"No elements found with name: {element_name}"
-            logger.error(error_msg)
-            return error_msg
+            return _err("No elements found with name: %s", element_name)
     except Exception as e:
-        error_msg = f"Failed to find elements with name '{element_name}': {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        return _err("Failed to find elements with name '%s': %s", element_name, e)
 
 
-@mcp.tool()
-def set_text(element_id: str, text: str) -> str:
-    """Set text in a GUI element by its ID."""
-    if not element_id:
-        error_msg = "No element ID specified."
-        logger.error(error_msg)
-        return error_msg
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot set text."
-        logger.error(error_msg)
-        return error_msg
+def _set_property(
+    session: win32com.client.CDispatch,
+    element_id: str,
+    name: str,
+    value: Any,
+    changes_screen: bool,
+    done: str,
+    failed: str,
+) -> str:
+    """
+    Assign one property of an element, the whole body of the setter tools.
+
+    Args:
+        session: SAP session the element belongs to.
+        element_id: ID of the element.
+        name: Property to assign, e.g. "Text" or "Key".
+        value: Value to assign.
+        changes_screen: The assignment may change the screen (see `apply_to_element`).
+        done: Success message template, formatted with the element ID and the value.
+        failed: Error message template, formatted with the element ID and the exception.
+
+    Returns:
+        The success message or the error message
+    """
     try:
-        _element = _current_session.FindById(element_id)
-        if not _element:
-            error_msg = f"No element found with ID: {element_id}"
-            logger.error(error_msg)
+        _, error_msg = _on_element(
+            session, element_id, lambda element: setattr(element, name, value), changes_screen=changes_screen
+        )
+        if error_msg:
             return error_msg
-        _element.Text = text
-        logger.info(f"Set text for element ID {element_id} to '{text}'")
-        return f"Set text for element ID {element_id} to '{text}'"
+        return _ok(done, element_id, value)
     except Exception as e:
-        error_msg = f"Failed to set text for element ID '{element_id}': {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        _forget(element_id)
+        return _err(failed, element_id, e)
+
+
+@mcp.tool()
+@require_session("set text")
+def set_text(session: win32com.client.CDispatch, element_id: NonEmptyStr, text: str) -> str:
+    """Set text in a GUI element by its ID."""
+    return _set_property(
+        session,
+        element_id,
+        "Text",
+        text,
+        False,
+        "Set text for element ID %s to '%s'",
+        "Failed to set text for element ID '%s': %s",
+    )
 
 
 @mcp.tool()
-def get_text(element_id: str) -> str:
+@require_session("get text")
+def get_text(session: win32com.client.CDispatch, element_id: NonEmptyStr) -> str:
     """Get text from a GUI element by its ID."""
-    if not element_id:
-        error_msg = "No element ID specified."
-        logger.error(error_msg)
-        return error_msg
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot get text."
-        logger.error(error_msg)
-        return error_msg
     try:
-        _element = _current_session.FindById(element_id)
-        if not _element:
-            error_msg = f"No element found with ID: {element_id}"
-            logger.error(error_msg)
+        text, error_msg = _on_element(session, element_id, lambda element: element.Text)
+        if error_msg:
             return error_msg
-        text = _element.Text
-        logger.info(f"Got text from element ID {element_id}: '{text}'")
+        logger.info("Got text from element ID %s: '%s'", element_id, text)
         return text
     except Exception as e:
-        error_msg = f"Failed to get text for element ID '{element_id}': {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        _forget(element_id)
+        return _err("Failed to get text for element ID '%s': %s", element_id, e)
 
 
 @mcp.tool()
-def press_button(element_id: str) -> str:
+@require_session("press button")
+def press_button(session: win32com.client.CDispatch, element_id: NonEmptyStr) -> str:
     """Press a button in the GUI by its element ID."""
-    if not element_id:
-        error_msg = "No element ID specified."
-        logger.error(error_msg)
-        return error_msg
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot press button."
-        logger.error(error_msg)
-        return error_msg
     try:
-        _element = _current_session.FindById(element_id)
-        if not _element:
-            error_msg = f"No element found with ID: {element_id}"
-            logger.error(error_msg)
+        _, error_msg = _on_element(session, element_id, lambda element: element.Press(), changes_screen=True)
+        if error_msg:
             return error_msg
-        _element.Press()
-        logger.info(f"Pressed button with element ID: {element_id}")
-        return f"Pressed button with element ID: {element_id}"
+        return _ok("Pressed button with element ID: %s", element_id)
     except Exception as e:
-        error_msg = f"Failed to press button with element ID '{element_id}': {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        _forget(element_id)
+        return _err("Failed to press button with element ID '%s': %s", element_id, e)
 
 
 @mcp.tool()
-def set_radio_button(element_id: str, selected: bool) -> str:
+@require_session("set radio button")
+def set_radio_button(session: win32com.client.CDispatch, element_id: NonEmptyStr, selected: bool) -> str:
     """Set a radio button's selected state by its element ID."""
-    if not element_id:
-        error_msg = "No element ID specified."
-        logger.error(error_msg)
-        return error_msg
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot set radio button."
-        logger.error(error_msg)
-        return error_msg
     try:
-        _element = _current_session.FindById(element_id)
-        if not _element:
-            error_msg = f"No element found with ID: {element_id}"
-            logger.error(error_msg)
+        _, error_msg = _on_element(session, element_id, lambda element: element.Select(), changes_screen=True)
+        if error_msg:
             return error_msg
-        _element.Select()
-        logger.info(f"Set radio button with element ID {element_id} to selected={selected}")
-        return f"Set radio button with element ID {element_id} to selected={selected}"
+        return _ok("Set radio button with element ID %s to selected=%s", element_id, selected)
     except Exception as e:
-        error_msg = f"Failed to set radio button with element ID '{element_id}': {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        _forget(element_id)
+        return _err("Failed to set radio button with element ID '%s': %s", element_id, e)
+
+
+def _grid_data(
+    grid: win32com.client.CDispatch, start_row: int = 0, end_row: Optional[int] = None, cols: Optional[list[str]] = None
+) -> dict:
+    """Read a row range of a grid into the grid data dictionary."""
+    # Get grid dimensions
+    row_count = grid.RowCount
+    visible_row_count = grid.VisibleRowCount
+
+    # Read the grid page by page; the first chunk holds the column titles
+    _chunks = iter_grid_chunks(grid, CHUNK_ROWS, start_row, end_row, cols)
+    columns = next(_chunks)[0]
+
+    # Report the range and columns actually read: iter_grid_chunks clamps the row range and `cols` may
+    # select a subset. The dict goes through the orjson tool serializer, and clients with structured
+    # output get it as an object
+    return {
+        "row_count": row_count,
+        "visible_row_count": visible_row_count,
+        "column_count": len(columns),
+        "start_row": max(start_row, 0),
+        "end_row": row_count if end_row is None else min(end_row, row_count),
+        "columns": columns,
+        # Each row is a list of values in `columns` order
+        "rows": list(chain.from_iterable(_chunks)),
+    }
 
 
 @mcp.tool()
-def get_grid_data(element_id: str) -> dict:
+@require_session()
+def get_grid_data(session: win32com.client.CDispatch, element_id: NonEmptyStr) -> dict:
     """
     Extract all data from an SAP GUI grid control.
 
@@ -481,46 +633,45 @@ def get_grid_data(element_id: str) -> dict:
         element_id: The ID of the grid shell element (e.g., '/app/con[0]/ses[0]/wnd[0]/usr/cntlGRID1/shellcont/shell')
 
     Returns:
-        Dictionary containing grid data with columns and rows
+        Dictionary containing grid data with columns and rows, or error dictionary
     """
-    try:
-        session = sap_session()
-        if not session:
-            return {"error": "No current session available."}
-        grid = session.FindById(element_id)
-
-        # Get grid dimensions
-        row_count = grid.RowCount
-        visible_row_count = grid.VisibleRowCount
-        column_count = grid.ColumnCount
-
-        # Get column information
-        column_order = grid.ColumnOrder
-        columns = [grid.GetColumnTitles(column_order.Item(col_idx)).Item(0) for col_idx in range(column_count - 1)]
-
-        # Extract row data
-        rows = []
-        for row_idx in range(row_count):
-            row_data = {}
-            for col_idx in range(column_count - 1):
-                cell_value = grid.GetCellValue(row_idx, column_order.Item(col_idx))
-                row_data[column_order.Item(col_idx)] = {"Column": columns[col_idx], "Value": cell_value}
-            rows.append({row_idx: row_data})
-
-        return {
-            "row_count": row_count,
-            "visible_row_count": visible_row_count,
-            "column_count": column_count,
-            "columns": columns,
-            "rows": rows,
-        }
+    return _apply_to_grid(session, element_id, _grid_data, f"Failed to extract grid data from element: {element_id}")
 
-    except Exception as e:
-        return {"error": str(e), "message": f"Failed to extract grid data from element: {element_id}"}
+
+@mcp.tool()
+@require_session()
+def get_grid_data_range(
+    session: win32com.client.CDispatch,
+    element_id: NonEmptyStr,
+    start_row: int,
+    end_row: int,
+    cols: Optional[list[str]] = None,
+) -> dict:
+    """
+    Extract a range of rows from an SAP GUI grid control.
+
+    Only the requested rows are scrolled into view and read, so this stays fast on grids with many rows.
+
+    Args:
+        element_id: The ID of the grid shell element
+        start_row: First row to read (0-based)
+        end_row: Row to stop before (exclusive); values past the last row are clamped
+        cols: Optional list of column IDs (field names, e.g. ["MATNR", "MAKTX"]) to read. If not provided, all columns are read.
+
+    Returns:
+        Dictionary containing grid data with columns and the requested rows, or error dictionary
+    """
+    return _apply_to_grid(
+        session,
+        element_id,
+        lambda grid: _grid_data(grid, start_row, end_row, cols),
+        f"Failed to extract grid data from element: {element_id}",
+    )
 
 
 @mcp.tool()
-def get_grid_cell_value(element_id: str, row: int, column: int) -> dict:
+@require_session()
+def get_grid_cell_value(session: win32com.client.CDispatch, element_id: NonEmptyStr, row: int, column: int) -> dict:
     """
     Get a specific cell value from an SAP GUI grid control.
 
@@ -532,23 +683,20 @@ def get_grid_cell_value(element_id: str, row: int, column: int) -> dict:
     Returns:
         Dictionary containing the cell value
     """
-    try:
-        session = sap_session()
-        if not session:
-            return {"error": "No current session available."}
-        grid = session.FindById(element_id)
-
-        cell_value = grid.GetCellValue(row, column)
-        column_title = grid.GetColumnTitle(column)
 
+    def _cell_value(grid: win32com.client.CDispatch) -> dict:
+        # GetCellValue and GetColumnTitles address columns by id, so map the display index to its id first
+        col_id = grid.ColumnOrder.Item(column)
+        cell_value = grid.GetCellValue(row, col_id)
+        column_title = column_titles(grid, (col_id,))[0]
         return {"row": row, "column": column, "column_title": column_title, "value": cell_value}
 
-    except Exception as e:
-        return {"error": str(e), "message": f"Failed to get cell value at row {row}, column {column}"}
+    return _apply_to_grid(session, element_id, _cell_value, f"Failed to get cell value at row {row}, column {column}")
 
 
 @mcp.tool()
-def select_grid_row(element_id: str, row: int) -> dict:
+@require_session()
+def select_grid_row(session: win32com.client.CDispatch, element_id: NonEmptyStr, row: int) -> dict:
     """
     Select a specific row in an SAP GUI grid control.
 
@@ -559,24 +707,53 @@ def select_grid_row(element_id: str, row: int) -> dict:
     Returns:
         Dictionary confirming the selection
     """
-    try:
-        session = sap_session()
-        if not session:
-            return {"error": "No current session available."}
-        grid = session.FindById(element_id)
 
+    def _select_row(grid: win32com.client.CDispatch) -> dict:
         # Set current cell position to select the row
         grid.CurrentCellRow = row
         grid.SelectedRows = str(row)
+        return {"selected_row": row, "message": f"Selected row {row}"}
 
-        return {"success": True, "selected_row": row, "message": f"Selected row {row}"}
+    return _on_grid(session, element_id, _select_row, f"Failed to select row {row}")
 
-    except Exception as e:
-        return {"error": str(e), "message": f"Failed to select row {row}"}
+
+def _selected_rows(grid: win32com.client.CDispatch) -> dict:
+    """Read the selected rows of a grid into the selected rows dictionary."""
+    # Get selected rows
+    selected_rows_str = grid.SelectedRows
+
+    if not selected_rows_str:
+        return {"selected_row_count": 0, "rows": []}
+
+    selected_indices = _selected_row_indices(selected_rows_str)
+
+    # Resolve the column ids once; each ColumnOrder.Item is a COM call and GetCellValue expects the id
+    column_order = grid.ColumnOrder
+    col_ids = [column_order.Item(col_idx) for col_idx in range(grid.ColumnCount)]
+    column_names = column_titles(grid, col_ids)
+
+    # Extract data from selected rows; each row is a list of values in `columns` order
+    get_cell_value = grid.GetCellValue
+    page_size = max(grid.VisibleRowCount, 1)
+    first_visible = -page_size
+    rows = []
+    for row_idx in selected_indices:
+        # GridView only loads rows from the backend once they are scrolled into view
+        if not first_visible <= row_idx < first_visible + page_size:
+            grid.FirstVisibleRow = first_visible = row_idx
+        rows.append([get_cell_value(row_idx, col_id) for col_id in col_ids])
+
+    return {
+        "selected_row_count": len(selected_indices),
+        "selected_indices": selected_indices,
+        "columns": column_names,
+        "rows": rows,
+    }
 
 
 @mcp.tool()
-def get_selected_grid_rows(element_id: str) -> dict:
+@require_session()
+def get_selected_grid_rows(session: win32com.client.CDispatch, element_id: NonEmptyStr) -> dict:
     """
     Get data from currently selected rows in an SAP GUI grid control.
 
@@ -586,48 +763,12 @@ def get_selected_grid_rows(element_id: str) -> dict:
     Returns:
         Dictionary containing selected rows data
     """
-    try:
-        session = sap_session()
-        if not session:
-            return {"error": "No current session available."}
-        grid = session.FindById(element_id)
-
-        # Get selected rows
-        selected_rows_str = grid.SelectedRows
-
-        if not selected_rows_str:
-            return {"selected_row_count": 0, "rows": []}
-
-        # Parse selected rows (format can be "1,2,3" or "1-5")
-        selected_indices = []
-        for part in selected_rows_str.split(","):
-            if "-" in part:
-                start, end = map(int, part.split("-"))
-                selected_indices.extend(range(start, end + 1))
-            else:
-                selected_indices.append(int(part))
-
-        # Get column information
-        column_count = grid.ColumnCount
-        column_names = [grid.GetColumnTitle(i) for i in range(column_count)]
-
-        # Extract data from selected rows
-        rows = []
-        for row_idx in selected_indices:
-            row_data = {}
-            for col_idx in range(column_count):
-                cell_value = grid.GetCellValue(row_idx, col_idx)
-                row_data[column_names[col_idx]] = cell_value
-            rows.append(row_data)
-
-        return {"selected_row_count": len(selected_indices), "selected_indices": selected_indices, "rows": rows}
-
-    except Exception as e:
-        return {"error": str(e), "message": "Failed to get selected rows"}
+    return _apply_to_grid(session, element_id, _selected_rows, "Failed to get selected rows")
 
 
 @mcp.tool()
-def double_click_grid_cell(element_id: str, row: int, column: int) -> dict:
+@require_session()
+def double_click_grid_cell(session: win32com.client.CDispatch, element_id: NonEmptyStr, row: int, column: int) -> dict:
     """
     Double-click on a specific cell in an SAP GUI grid control.
     This typically opens the detail view or drills down into the record.
@@ -638,89 +779,131 @@ def double_click_grid_cell(element_id: str, row: int, column: int) -> dict:
         column: Column index (0-based)
 
     Returns:
-        Dictionary confirming the action
+        Dictionary confirming the action, with a "warning" if SAP GUI was still busy after GRID_ACTION_TIMEOUT seconds
     """
-    try:
-        session = sap_session()
-        if not session:
-            return {"error": "No current session available."}
-        grid = session.FindById(element_id)
-
-        # Set current cell and double-click
-        grid.CurrentCellRow = row
-        grid.CurrentCellColumn = column
-        grid.DoubleClick(row, column)
-
-        return {
-            "success": True,
-            "row": row,
-            "column": column,
-            "message": f"Double-clicked cell at row {row}, column {column}",
-        }
 
-    except Exception as e:
-        return {"error": str(e), "message": f"Failed to double-click cell at row {row}, column {column}"}
+    def _double_click(grid: win32com.client.CDispatch) -> dict:
+        # DoubleClick takes the column id and makes the cell current itself; drilling down usually opens
+        # another screen, so wait for SAP GUI to settle before the next tool call touches it
+        grid.DoubleClick(row, grid.ColumnOrder.Item(column))
+        _settled = wait_until(lambda: not session.Busy, GRID_ACTION_TIMEOUT)
+
+        fields = {"row": row, "column": column, "message": f"Double-clicked cell at row {row}, column {column}"}
+        if not _settled:
+            # The double-click went through, but the screen it opens may not be there yet
+            fields["warning"] = f"SAP GUI was still busy {GRID_ACTION_TIMEOUT:g}s after the double-click"
+            logger.warning("%s on grid '%s'", fields["warning"], element_id)
+        return fields
+
+    return _on_grid(
+        session,
+        element_id,
+        _double_click,
+        f"Failed to double-click cell at row {row}, column {column}",
+        changes_screen=True,
+    )
 
 
 @mcp.tool()
-def set_checkbox(element_id: str, state: bool) -> str:
+@require_session("set checkbox")
+def set_checkbox(session: win32com.client.CDispatch, element_id: NonEmptyStr, state: bool) -> str:
     """Set the state of a checkbox element by its ID."""
-    if not element_id:
-        error_msg = "No element ID specified."
-        logger.error(error_msg)
-        return error_msg
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot set checkbox."
-        logger.error(error_msg)
-        return error_msg
+    return _set_property(
+        session,
+        element_id,
+        "Selected",
+        state,
+        True,
+        "Set checkbox with element ID %s to state=%s",
+        "Failed to set checkbox with element ID '%s': %s",
+    )
+
+
+def _apply_to_grid(
+    session: win32com.client.CDispatch,
+    element_id: str,
+    action: Callable[[win32com.client.CDispatch], dict],
+    failure: str,
+    changes_screen: bool = False,
+) -> dict:
+    """
+    Apply `action` to a grid through the element cache and return its result dict.
+
+    The grid is resolved by `apply_to_element`, so a cached grid left behind by a screen change is
+    resolved again in the same call instead of failing once.
+
+    Args:
+        session: SAP session the grid belongs to.
+        element_id: ID of the grid shell element.
+        action: Called with the grid; returns the tool result.
+        failure: Message reported next to the error when the COM call fails.
+        changes_screen: The action may change the screen, so the element cache is cleared before it runs.
+
+    Returns:
+        The result of `action`, otherwise a dict with an "error" entry
+    """
     try:
-        _element = _current_session.FindById(element_id)
-        if not _element:
-            error_msg = f"No element found with ID: {element_id}"
-            logger.error(error_msg)
-            return error_msg
-        _element.Selected = state
-        logger.info(f"Set checkbox with element ID {element_id} to state={state}")
-        return f"Set checkbox with element ID {element_id} to state={state}"
+        found, result = apply_to_element(session, element_id, action, changes_screen)
+        if not found:
+            return {"error": GRID_NOT_FOUND % element_id}
+        return result
+
     except Exception as e:
-        error_msg = f"Failed to set checkbox with element ID '{element_id}': {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        _forget(element_id)
+        return {"error": _error_text(e), "message": failure}
 
 
-@mcp.tool()
-def get_vertical_scrollbar_position(element_id: str) -> dict:
+def _on_grid(
+    session: win32com.client.CDispatch,
+    element_id: str,
+    action: Callable[[win32com.client.CDispatch], Optional[dict]],
+    failure: str,
+    changes_screen: bool = False,
+) -> dict:
     """
-    Get the current position of the vertical scrollbar in an SAP GUI grid control.
+    Apply `action` to a grid and wrap the outcome in the success result the grid tools return.
 
     Args:
-        element_id: The ID of the grid shell element
+        session: SAP session the grid belongs to.
+        element_id: ID of the grid shell element.
+        action: Called with the grid; may return extra fields for the success result.
+        failure: Message reported next to the error when the COM call fails.
+        changes_screen: The action may change the screen, so the element cache is cleared before it runs.
 
     Returns:
-        Dictionary containing the vertical scrollbar position
+        {"success": True, **fields} on success, otherwise a dict with an "error" entry
     """
-    if not element_id:
-        return {"error": "No element ID specified."}
 
-    session = sap_session()
-    if not session:
-        return {"error": "No current session available."}
+    def _succeed(grid: win32com.client.CDispatch) -> dict:
+        fields = action(grid)
+        return SUCCESS_RESULT if fields is None else {"success": True, **fields}
 
-    try:
-        grid = session.FindById(element_id)
-        if not grid:
-            return {"error": f"No grid found with ID: {element_id}"}
+    return _apply_to_grid(session, element_id, _succeed, failure, changes_screen)
 
-        scrollbar_position = grid.VerticalScrollbar.Position
-        return {"success": True, "scrollbar_position": scrollbar_position}
 
-    except Exception as e:
-        return {"error": str(e), "message": "Failed to get vertical scrollbar position"}
+@mcp.tool()
+@require_session()
+def get_vertical_scrollbar_position(session: win32com.client.CDispatch, element_id: NonEmptyStr) -> dict:
+    """
+    Get the current position of the vertical scrollbar in an SAP GUI grid control.
+
+    Args:
+        element_id: The ID of the grid shell element
+
+    Returns:
+        Dictionary containing the vertical scrollbar position
+    """
+    return _on_grid(
+        session,
+        element_id,
+        lambda grid: {"scrollbar_position": grid_scrollbar(grid, "v").Position},
+        "Failed to get vertical scrollbar position",
+    )
 
 
 @mcp.tool()
-def set_vertical_scrollbar_position(element_id: str, position: int) -> dict:
+@require_session()
+def set_vertical_scrollbar_position(session: win32com.client.CDispatch, element_id: NonEmptyStr, position: int) -> dict:
     """
     Set the position of the vertical scrollbar in an SAP GUI grid control.
 
@@ -731,190 +914,284 @@ def set_vertical_scrollbar_position(element_id: str, position: int) -> dict:
     Returns:
         Dictionary indicating success or failure
     """
-    if not element_id:
-        return {"error": "No element ID specified."}
+    return _on_grid(
+        session,
+        element_id,
+        lambda grid: setattr(grid_scrollbar(grid, "v"), "Position", position),
+        "Failed to set vertical scrollbar position",
+    )
 
-    session = sap_session()
-    if not session:
-        return {"error": "No current session available."}
 
-    try:
-        grid = session.FindById(element_id)
-        if not grid:
-            return {"error": f"No grid found with ID: {element_id}"}
+@mcp.tool()
+@require_session()
+def get_horizontal_scrollbar_position(session: win32com.client.CDispatch, element_id: NonEmptyStr) -> dict:
+    """
+    Get the current position of the horizontal scrollbar in an SAP GUI grid control.
 
-        grid.VerticalScrollbar.Position = position
-        return {"success": True}
+    Args:
+        element_id: The ID of the grid shell element
 
-    except Exception as e:
-        return {"error": str(e), "message": "Failed to set vertical scrollbar position"}
+    Returns:
+        Dictionary containing the horizontal scrollbar position
+    """
+    return _on_grid(
+        session,
+        element_id,
+        lambda grid: {"scrollbar_position": grid_scrollbar(grid, "h").Position},
+        "Failed to get horizontal scrollbar position",
+    )
 
 
 @mcp.tool()
-def get_horizontal_scrollbar_position(element_id: str) -> dict:
+@require_session()
+def set_horizontal_scrollbar_position(
+    session: win32com.client.CDispatch,
+    element_id: NonEmptyStr,
+    position: int,
+) -> dict:
     """
-    Get the current position of the horizontal scrollbar in an SAP GUI grid control.
+    Set the position of the horizontal scrollbar in an SAP GUI grid control.
 
     Args:
         element_id: The ID of the grid shell element
+        position: The desired scrollbar position
 
     Returns:
-        Dictionary containing the horizontal scrollbar position
+        Dictionary indicating success or failure
     """
-    if not element_id:
-        return {"error": "No element ID specified."}
+    return _on_grid(
+        session,
+        element_id,
+        lambda grid: setattr(grid_scrollbar(grid, "h"), "Position", position),
+        "Failed to set horizontal scrollbar position",
+    )
 
-    session = sap_session()
-    if not session:
-        return {"error": "No current session available."}
 
-    try:
-        grid = session.FindById(element_id)
-        if not grid:
-            return {"error": f"No grid found with ID: {element_id}"}
+def _scrollbar_positions(grid: win32com.client.CDispatch) -> dict:
+    """Read the vertical and horizontal scrollbar positions of a grid."""
+    return {
+        "vertical_position": grid_scrollbar(grid, "v").Position,
+        "horizontal_position": grid_scrollbar(grid, "h").Position,
+    }
 
-        scrollbar_position = grid.HorizontalScrollbar.Position
-        return {"success": True, "scrollbar_position": scrollbar_position}
 
-    except Exception as e:
-        return {"error": str(e), "message": "Failed to get horizontal scrollbar position"}
+def _set_scrollbar_positions(
+    grid: win32com.client.CDispatch, vertical: Optional[int], horizontal: Optional[int]
+) -> None:
+    """Set the scrollbar positions of a grid, leaving an axis alone when its position is None."""
+    if vertical is not None:
+        grid_scrollbar(grid, "v").Position = vertical
+    if horizontal is not None:
+        grid_scrollbar(grid, "h").Position = horizontal
 
 
 @mcp.tool()
-def set_horizontal_scrollbar_position(element_id: str, position: int) -> dict:
+@require_session()
+def get_scrollbars(session: win32com.client.CDispatch, element_id: NonEmptyStr) -> dict:
     """
-    Set the position of the horizontal scrollbar in an SAP GUI grid control.
+    Get the positions of both scrollbars of an SAP GUI grid control in one call.
 
     Args:
         element_id: The ID of the grid shell element
-        position: The desired scrollbar position
 
     Returns:
-        Dictionary indicating success or failure
+        Dictionary containing the vertical and horizontal scrollbar positions
     """
-    if not element_id:
-        return {"error": "No element ID specified."}
+    return _on_grid(session, element_id, _scrollbar_positions, "Failed to get scrollbar positions")
 
-    session = sap_session()
-    if not session:
-        return {"error": "No current session available."}
 
-    try:
-        grid = session.FindById(element_id)
-        if not grid:
-            return {"error": f"No grid found with ID: {element_id}"}
+@mcp.tool()
+@require_session()
+def set_scrollbars(
+    session: win32com.client.CDispatch,
+    element_id: NonEmptyStr,
+    vertical: Optional[int] = None,
+    horizontal: Optional[int] = None,
+) -> dict:
+    """
+    Set the positions of both scrollbars of an SAP GUI grid control in one call.
 
-        grid.HorizontalScrollbar.Position = position
-        return {"success": True}
+    Args:
+        element_id: The ID of the grid shell element
+        vertical: Optional desired vertical scrollbar position. If not provided, the vertical scrollbar is left as is.
+        horizontal: Optional desired horizontal scrollbar position. If not provided, the horizontal scrollbar is left as is.
 
-    except Exception as e:
-        return {"error": str(e), "message": "Failed to set horizontal scrollbar position"}
+    Returns:
+        Dictionary indicating success or failure
+    """
+    return _on_grid(
+        session,
+        element_id,
+        lambda grid: _set_scrollbar_positions(grid, vertical, horizontal),
+        "Failed to set scrollbar positions",
+    )
 
 
 @mcp.tool()
-def maximize_window() -> str:
+@require_session("maximize window")
+def maximize_window(session: win32com.client.CDispatch) -> str:
     """Maximize the current SAP GUI window."""
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot maximize window."
-        logger.error(error_msg)
-        return error_msg
     try:
-        _current_window = _current_session.ActiveWindow
-        if not _current_window:
-            error_msg = "No active window found in the current session."
-            logger.error(error_msg)
-            return error_msg
+        _current_window = session.ActiveWindow
+        if _current_window is None:
+            return _err("No active window found in the current session.")
         _current_window.Maximize()
-        logger.info("Maximized the current SAP GUI window.")
-        return "Maximized the current SAP GUI window."
+        return _ok("Maximized the current SAP GUI window.")
     except Exception as e:
-        error_msg = f"Failed to maximize window: {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        return _err("Failed to maximize window: %s", e)
 
 
 @mcp.tool()
-def set_focus(element_id: str) -> str:
+@require_session("set focus")
+def set_focus(session: win32com.client.CDispatch, element_id: NonEmptyStr) -> str:
     """Set focus to a GUI element by its ID."""
-    if not element_id:
-        error_msg = "No element ID specified."
-        logger.error(error_msg)
-        return error_msg
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot set focus."
-        logger.error(error_msg)
-        return error_msg
     try:
-        _element = _current_session.FindById(element_id)
-        if not _element:
-            error_msg = f"No element found with ID: {element_id}"
-            logger.error(error_msg)
+        _, error_msg = _on_element(session, element_id, lambda element: element.SetFocus())
+        if error_msg:
             return error_msg
-        _element.SetFocus()
-        logger.info(f"Set focus to element with ID: {element_id}")
-        return f"Set focus to element with ID: {element_id}"
+        return _ok("Set focus to element with ID: %s", element_id)
     except Exception as e:
-        error_msg = f"Failed to set focus for element ID '{element_id}': {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+        _forget(element_id)
+        return _err("Failed to set focus for element ID '%s': %s", element_id, e)
 
 
 @mcp.tool()
-def set_combobox(element_id: str, key: str) -> str:
+@require_session("set combo box")
+def set_combobox(session: win32com.client.CDispatch, element_id: NonEmptyStr, key: str) -> str:
     """Set the value of a combo box element by its ID."""
-    if not element_id:
-        error_msg = "No element ID specified."
-        logger.error(error_msg)
-        return error_msg
-    _current_session = sap_session()
-    if not _current_session:
-        error_msg = "No current session available. Cannot set combo box."
-        logger.error(error_msg)
-        return error_msg
-    try:
-        _element = _current_session.FindById(element_id)
-        if not _element:
-            error_msg = f"No element found with ID: {element_id}"
-            logger.error(error_msg)
-            return error_msg
-        _element.Key = key
-        logger.info(f"Set combo box with element ID {element_id} to key='{key}'")
-        return f"Set combo box with element ID {element_id} to key='{key}'"
-    except Exception as e:
-        error_msg = f"Failed to set combo box with element ID '{element_id}': {str(e)}"
-        logger.error(error_msg)
-        return error_msg
+    return _set_property(
+        session,
+        element_id,
+        "Key",
+        key,
+        True,
+        "Set combo box with element ID %s to key='%s'",
+        "Failed to set combo box with element ID '%s': %s",
+    )
+
+
+# batch_ui operations: op name -> (action on the element and the op's "value", whether it can change the screen,
+# type the op's "value" must have or None if it takes no value)
+BATCH_UI_OPS: dict[str, tuple[Callable, bool, Optional[type]]] = {
+    "focus": (lambda element, value: element.SetFocus(), False, None),
+    "text": (lambda element, value: setattr(element, "Text", value), False, str),
+    "key": (lambda element, value: setattr(element, "Key", value), True, str),
+    "check": (lambda element, value: setattr(element, "Selected", value), True, bool),
+    "select": (lambda element, value: element.Select(), True, None),
+    "press": (lambda element, value: element.Press(), True, None),
+    "vscroll": (lambda element, value: setattr(grid_scrollbar(element, "v"), "Position", value), False, int),
+    "hscroll": (lambda element, value: setattr(grid_scrollbar(element, "h"), "Position", value), False, int),
+}
+
+
+class UiOp(BaseModel):
+    """One batch_ui operation; FastMCP rejects a batch with an invalid operation before any of it runs."""
+
+    # Built from BATCH_UI_OPS so a new op only has to be added there; the schema still lists the op names
+    op: Literal[tuple(BATCH_UI_OPS)]
+    id: NonEmptyStr
+    value: Optional[bool | int | str] = None
+
+    @model_validator(mode="after")
+    def _check_value(self) -> "UiOp":
+        """Require the value type of the op, so e.g. "false" never reaches a checkbox as a truthy string."""
+        _value_type = BATCH_UI_OPS[self.op][2]
+        # Compare exact types, bool is a subclass of int
+        if _value_type is not None and type(self.value) is not _value_type:
+            raise ValueError(f"op '{self.op}' needs a {_value_type.__name__} value, got {self.value!r}")
+        return self
+
+
+@mcp.tool()
+@require_session("run UI batch")
+def batch_ui(session: win32com.client.CDispatch, ops: list[UiOp]) -> list[str] | str:
+    """
+    Run several UI operations in one tool call.
+
+    Operations run in order; the batch stops at the first operation that fails.
+
+    Args:
+        ops: List of operations, each {"op": <op>, "id": <element ID>, "value": <value>}. Supported ops:
+             "focus", "text" (value: text), "key" (value: combo box key), "check" (value: true or false),
+             "select" (radio button), "press" (button) and "vscroll"/"hscroll" (value: integer grid scrollbar position).
+
+    Returns:
+        "ok" for each operation that succeeded followed by the error message of the failed one, if any,
+        or an error message if no session is available
+    """
+    results = []
+    for op_idx, op in enumerate(ops):
+        apply, changes_screen, _ = BATCH_UI_OPS[op.op]
+        try:
+            _, error_msg = _on_element(session, op.id, lambda element: apply(element, op.value), changes_screen)
+            if error_msg:
+                results.append(error_msg)
+                break
+            results.append("ok")
+        except Exception as e:
+            _forget(op.id)
+            results.append(_err("Operation %s on element ID '%s' failed: %s", op_idx, op.id, e))
+            break
+    logger.info("Ran %s of %s UI batch operations.", len(results), len(ops))
+    return results
 
 
 @mcp.tool()
-def take_screenshot(output_path: Optional[str] = None, window_id: Optional[str] = None) -> str:
+async def take_screenshot(
+    output_path: Optional[str] = None, window_id: Optional[str] = None, inline: bool = False
+) -> str:
     """
     Capture a screenshot of the SAP GUI window for documentation purposes.
 
+    The capture runs on the COM worker thread, so other tools are not blocked while the image is written.
+
     Args:
         output_path: Optional path where the screenshot should be saved (e.g., "C:\\screenshots\\my_screenshot.png").
                     If not provided, saves to "./screenshots/sap_screenshot_YYYYMMDD_HHMMSS.png"
         window_id: Optional ID of the specific window to capture (e.g., "wnd[0]", "wnd[1]").
                   If not provided, captures the currently active window.
+        inline: If True, return the PNG as a base64 string instead of saving it; output_path is ignored.
 
     Returns:
-        Success message with file path or error message
+        Success message with file path, base64-encoded PNG data when inline, or error message
     """
-    success, message = capture_screenshot(output_path=output_path, window_id=window_id)
-    if success:
-        logger.info(message)
-    else:
-        logger.error(message)
+    if inline:
+        # Only a local temp file is touched, never the (possibly network) screenshot directory
+        image, message = await run_com(capture_screenshot_bytes, window_id=window_id)
+        return message if image is None else base64.b64encode(image).decode("ascii")
+
+    # capture_screenshot already logs the outcome on the sap_controller logger
+    _, message = await run_com(capture_screenshot, output_path=output_path, window_id=window_id)
     return message
 
 
 @mcp.tool()
-def export_grid_data_as_csv(
-    grid_id: str,
+async def get_screenshot_image(
+    window_id: Optional[str] = None, image_format: Literal["png", "jpeg"] = "png"
+) -> Image | str:
+    """
+    Capture a screenshot of the SAP GUI window and return the image itself instead of saving it.
+
+    Args:
+        window_id: Optional ID of the specific window to capture (e.g., "wnd[0]", "wnd[1]").
+                  If not provided, captures the currently active window.
+        image_format: "png" (default, lossless) or "jpeg" (smaller, cheaper to encode and transfer).
+
+    Returns:
+        Image of the window or error message
+    """
+    image, message = await run_com(capture_screenshot_bytes, window_id=window_id, image_format=image_format)
+    if image is None:
+        return message
+    return Image(data=image, format=image_format)
+
+
+@mcp.tool()
+async def export_grid_data_as_csv(
+    grid_id: NonEmptyStr,
     output_path: Optional[str] = None,
     identifier: Optional[str] = None,
+    bulk: bool = False,
 ) -> str:
     """
     Export SAP GUI grid data to a CSV file.
@@ -923,17 +1200,20 @@ def export_grid_data_as_csv(
         grid_id: SAP GUI element ID of the grid to export.
         output_path: Path where the exported CSV should be saved. If None, generates a default path.
         identifier: Optional identifier or name for the export operation, such as transaction code or table name. Will be included in the filename if provided.
+        bulk: Let SAP GUI's ALV spreadsheet export write the file in one go instead of reading the grid cell by cell. Much faster for large grids; falls back to the cell-by-cell read if the grid has no such export.
 
     Returns:
         Success message with file path or error message
     """
-    export_path, message = export_grid_as_csv(
-        grid_id=grid_id, session=None, output_path=output_path, identifier=identifier
+    # export_grid_as_csv already logs the outcome on the sap_controller logger
+    _, message = await run_com(
+        export_grid_as_csv,
+        grid_id=grid_id,
+        session=None,
+        output_path=output_path,
+        identifier=identifier,
+        bulk=bulk,
     )
-    if export_path:
-        logger.info(message)
-    else:
-        logger.error(message)
     return message
 
 
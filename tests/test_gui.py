@@ -0,0 +1,43 @@
+"""Unit tests for the object tree helpers in sap.gui."""
+
+import os
+import sys
+
+import pytest
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# sap.gui talks to SAP GUI through pywin32, which only exists on Windows
+pytest.importorskip("win32com.client")
+
+from sap.gui import _prune_tree
+
+
+TREE = {
+    "properties": {"Id": "/app/con[0]/ses[0]/wnd[0]"},
+    "children": [
+        {"properties": {"Id": "wnd[0]/usr"}, "children": [{"properties": {"Id": "wnd[0]/usr/txtA"}}]},
+        {"properties": {"Id": "wnd[0]/sbar"}, "children": []},
+    ],
+}
+
+
+def test_depth_zero_drops_all_children():
+    assert _prune_tree(TREE, 0) == {"properties": TREE["properties"]}
+
+
+def test_depth_keeps_that_many_levels():
+    pruned = _prune_tree(TREE, 1)
+    assert [child["properties"]["Id"] for child in pruned["children"]] == ["wnd[0]/usr", "wnd[0]/sbar"]
+    assert "children" not in pruned["children"][0]
+
+
+def test_deep_enough_depth_keeps_the_whole_tree():
+    assert _prune_tree(TREE, 5) == TREE
+
+
+def test_pruning_leaves_the_input_alone():
+    _prune_tree(TREE, 0)
+    assert len(TREE["children"]) == 2
+    assert TREE["children"][0]["children"]
@@ -0,0 +1,40 @@
+"""Unit tests for the login parameter helper in sap.logon_pad."""
+
+import os
+import sys
+
+import pytest
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# sap.logon_pad talks to SAP GUI through pywin32, which only exists on Windows
+pytest.importorskip("win32com.client")
+
+from sap import logon_pad
+
+
+@pytest.fixture
+def sap_env(monkeypatch):
+    """Replace the environment snapshot with a known one."""
+    env = {"SAP_SYSTEM": "ENV_SYS", "SAP_CLIENT": "100", "SAP_USER": "ENV_USER"}
+    monkeypatch.setattr(logon_pad, "SAP_ENV", env)
+    return env
+
+
+def test_arguments_take_precedence_over_environment(sap_env):
+    params, missing = logon_pad.resolve_login_params(system="ARG_SYS", password="secret")
+    assert params == {"system": "ARG_SYS", "client": "100", "user": "ENV_USER", "password": "secret"}
+    assert missing == []
+
+
+def test_missing_parameters_name_their_environment_variable(sap_env):
+    params, missing = logon_pad.resolve_login_params()
+    assert params["password"] is None
+    assert missing == ["password (SAP_PASSWORD)"]
+
+
+def test_sso_only_requires_the_system(monkeypatch):
+    monkeypatch.setattr(logon_pad, "SAP_ENV", {})
+    assert logon_pad.resolve_login_params(system="SYS", use_sso=True)[1] == []
+    assert logon_pad.resolve_login_params(use_sso=True)[1] == ["system (SAP_SYSTEM)"]
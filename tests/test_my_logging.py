@@ -0,0 +1,58 @@
+"""Unit tests for the bounded log queue handler in my_logging."""
+
+import logging
+import os
+import queue
+import sys
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from my_logging.my_logging import _DroppingQueueHandler
+
+
+def _record(msg: str, *args) -> logging.LogRecord:
+    return logging.makeLogRecord({"name": "test", "levelno": logging.INFO, "msg": msg, "args": args})
+
+
+def test_prepare_merges_arguments_into_message():
+    """Queued records carry the formatted message, so later changes to the arguments do not show up."""
+    handler = _DroppingQueueHandler(queue.Queue())
+    values = ["before"]
+    record = _record("value: %s", values)
+
+    prepared = handler.prepare(record)
+    values.append("after")
+    assert prepared.msg == "value: ['before']"
+    assert prepared.args is None
+    # The original record is left alone for other handlers
+    assert record.args == (values,)
+
+
+def test_full_queue_drops_records_and_reports_the_loss():
+    """Records that do not fit are counted and reported ahead of the next record that gets through."""
+    log_queue = queue.Queue(maxsize=1)
+    handler = _DroppingQueueHandler(log_queue)
+
+    handler.emit(_record("first"))
+    handler.emit(_record("second"))
+    handler.emit(_record("third"))
+    assert handler.dropped == 2
+    assert log_queue.get_nowait().msg == "first"
+
+    # The drop warning takes the free slot; the record behind it is dropped again and counted afresh
+    handler.emit(_record("fourth"))
+    warning = log_queue.get_nowait()
+    assert warning.levelno == logging.WARNING
+    assert warning.getMessage() == "Dropped 2 log records because the log queue was full"
+    assert handler.dropped == 1
+
+
+def test_no_drop_warning_while_the_queue_has_room():
+    """Nothing extra is queued as long as no record was dropped."""
+    log_queue = queue.Queue()
+    handler = _DroppingQueueHandler(log_queue)
+
+    handler.emit(_record("only"))
+    assert handler.dropped == 0
+    assert [log_queue.get_nowait().msg for _ in range(log_queue.qsize())] == ["only"]
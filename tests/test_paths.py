@@ -0,0 +1,34 @@
+"""Unit tests for the file name helpers in sap.paths."""
+
+import os
+import sys
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from sap import paths
+
+
+def test_unique_file_timestamp_counts_calls_within_a_second(monkeypatch):
+    """The first name in a second is the plain timestamp, further ones get a counter."""
+    monkeypatch.setattr(paths, "_last_timestamp", [-1, "", 0])
+    monkeypatch.setattr(paths.time, "time", lambda: 1_700_000_000.25)
+
+    stamp = paths.unique_file_timestamp()
+    assert len(stamp) == len("YYYYMMDD_HHMMSS")
+    assert paths.unique_file_timestamp() == f"{stamp}_1"
+    assert paths.unique_file_timestamp() == f"{stamp}_2"
+
+
+def test_unique_file_timestamp_restarts_in_a_new_second(monkeypatch):
+    """The counter starts over once the second changes."""
+    monkeypatch.setattr(paths, "_last_timestamp", [-1, "", 0])
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(paths.time, "time", lambda: now[0])
+
+    first = paths.unique_file_timestamp()
+    paths.unique_file_timestamp()
+    now[0] += 1
+    second = paths.unique_file_timestamp()
+    assert second != first
+    assert "_" not in second[len("YYYYMMDD_") :]
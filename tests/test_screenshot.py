@@ -5,6 +5,8 @@ This script tests the screenshot capture feature by:
 1. Checking if SAP GUI is running and a session is available
 2. Capturing a screenshot with automatic naming
 3. Capturing a screenshot with a custom path
+4. Capturing a screenshot of a specific window
+5. Capturing a screenshot in memory as PNG and JPEG, and rejecting an unsupported image format
 
 Prerequisites:
 - SAP GUI must be running
@@ -22,9 +24,9 @@ if sys.platform == "win32":
     sys.stderr = codecs.getwriter("utf-8")(sys.stderr.buffer, "strict")
 
 # Add src directory to path for imports
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
 
-from sap.gui import capture_screenshot
+from sap.gui import capture_screenshot, capture_screenshot_bytes
 from sap.logon_pad import sap_session
 
 
@@ -82,6 +84,24 @@ def test_screenshot_capture():
         print(f"❌ FAILED: {message}")
         return False
 
+    # Test 5: Capture screenshots in memory in each image format
+    print("\n[Test 5] Capturing screenshots as bytes (png, jpeg)...")
+    for image_format, signature in (("png", b"\x89PNG"), ("jpeg", b"\xff\xd8")):
+        image, message = capture_screenshot_bytes(image_format=image_format)
+        if image is None:
+            print(f"❌ FAILED: {message}")
+            return False
+        if not image.startswith(signature):
+            print(f"❌ FAILED: {image_format} image does not start with the {image_format} signature")
+            return False
+        print(f"✓ SUCCESS: {image_format} image captured ({len(image)} bytes)")
+
+    image, message = capture_screenshot_bytes(image_format="gif")
+    if image is not None:
+        print("❌ FAILED: Unsupported image format 'gif' was accepted")
+        return False
+    print(f"✓ SUCCESS: Unsupported image format rejected - {message}")
+
     print("\n" + "=" * 60)
     print("All tests completed successfully!")
     print("=" * 60)
@@ -0,0 +1,43 @@
+"""Unit tests for the COM-free helpers in server."""
+
+import os
+import sys
+
+import pytest
+
+# Add src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# server drives SAP GUI through pywin32, which only exists on Windows, and serves tools with FastMCP
+pythoncom = pytest.importorskip("pythoncom")
+pytest.importorskip("fastmcp")
+
+from server import _error_text, _selected_row_indices
+
+
+@pytest.mark.parametrize(
+    ("selected_rows", "expected"),
+    [
+        ("3", [3]),
+        ("1,2,3", [1, 2, 3]),
+        ("1-4", [1, 2, 3, 4]),
+        ("0,5-7,10", [0, 5, 6, 7, 10]),
+        # Overlapping entries are listed once, in first-seen order
+        ("2-4,3,1", [2, 3, 4, 1]),
+        ("", []),
+    ],
+)
+def test_selected_row_indices(selected_rows, expected):
+    assert _selected_row_indices(selected_rows) == expected
+
+
+def test_error_text_prefers_the_com_description():
+    excepinfo = (0, "SAP Frontend Server", "The control could not be found by id.", None, 0, 0)
+    error = pythoncom.com_error(-2147352567, "Exception occurred.", excepinfo, None)
+    assert _error_text(error) == "The control could not be found by id."
+
+
+def test_error_text_falls_back_to_the_exception_text():
+    error = pythoncom.com_error(-2147352567, "Exception occurred.", None, None)
+    assert _error_text(error) == str(error)
+    assert _error_text(ValueError("bad value")) == "bad value"